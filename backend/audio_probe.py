@@ -0,0 +1,325 @@
+"""
+Audio Header Probe for DayVibe
+Identifies the container from magic bytes and reads sample rate, channels and
+duration from the headers alone, without decoding any audio
+"""
+import struct
+from typing import Dict, Optional
+
+# Sanity bounds for header values
+MIN_SAMPLE_RATE = 1000
+MAX_SAMPLE_RATE = 384000
+MAX_CHANNELS = 8
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_IEEE_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Opus always decodes at 48 kHz, whatever the input rate in its header
+OPUS_GRANULE_RATE = 48000
+
+# Where to look for the last Ogg page when computing duration
+OGG_TAIL_BYTES = 64 * 1024
+
+
+class InvalidAudioFile(ValueError):
+    """Raised when a payload isn't a recognizable, well-formed audio file"""
+
+
+def sniff_container(head: bytes) -> Optional[str]:
+    """Container name from the first bytes of a file, or None if unrecognized"""
+    if len(head) >= 12 and head[0:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[0:4] == b"fLaC":
+        return "flac"
+    if head[0:4] == b"OggS":
+        return "ogg"
+    if head[0:4] == b"\x1a\x45\xdf\xa3":
+        return "webm"
+    if len(head) >= 8 and head[4:8] == b"ftyp":
+        return "mp4"
+    if head[0:3] == b"ID3" or (len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def parse_wav_header(buffer) -> Optional[Dict]:
+    """Locate the fmt and data chunks of a RIFF/WAVE buffer without copying it"""
+    view = memoryview(buffer)
+    if len(view) < 12 or view[0:4] != b"RIFF" or view[8:12] != b"WAVE":
+        return None
+
+    info: Dict = {}
+    offset = 12
+    while offset + 8 <= len(view):
+        chunk_id = bytes(view[offset:offset + 4])
+        chunk_size = struct.unpack_from("<I", view, offset + 4)[0]
+        body = offset + 8
+
+        if chunk_id == b"fmt " and chunk_size >= 16 and body + 16 <= len(view):
+            format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", view, body)
+            if format_tag == WAVE_FORMAT_EXTENSIBLE and chunk_size >= 26 and body + 26 <= len(view):
+                format_tag = struct.unpack_from("<H", view, body + 24)[0]
+            info.update(
+                format_tag=format_tag,
+                channels=channels,
+                sample_rate=sample_rate,
+                block_align=block_align,
+                bits_per_sample=bits
+            )
+        elif chunk_id == b"data":
+            # Streamed recorders may leave the size as 0 or 0xFFFFFFFF
+            available = len(view) - body
+            if chunk_size == 0 or chunk_size > available:
+                chunk_size = available
+            info.update(data_offset=body, data_size=chunk_size)
+            break
+
+        offset = body + chunk_size + (chunk_size & 1)
+
+    if "format_tag" not in info or "data_offset" not in info:
+        return None
+    return info
+
+
+def _probe_wav(view: memoryview) -> Dict:
+    info = parse_wav_header(view)
+    if info is None:
+        raise InvalidAudioFile("WAV file is missing its fmt or data chunk")
+    if not info["block_align"]:
+        raise InvalidAudioFile("WAV header has zero block alignment")
+
+    frames = info["data_size"] // info["block_align"]
+    if frames == 0:
+        raise InvalidAudioFile("WAV file has no audio frames")
+    return {
+        "sample_rate": info["sample_rate"],
+        "channels": info["channels"],
+        "duration_seconds": frames / info["sample_rate"] if info["sample_rate"] else None
+    }
+
+
+def _probe_flac(view: memoryview) -> Dict:
+    # STREAMINFO is always the first metadata block
+    if len(view) < 8 + 34 or view[4] & 0x7F != 0:
+        raise InvalidAudioFile("FLAC file is missing STREAMINFO")
+
+    info = bytes(view[8 + 10:8 + 18])
+    packed = int.from_bytes(info, "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "duration_seconds": total_samples / sample_rate if total_samples and sample_rate else None
+    }
+
+
+def _probe_ogg(view: memoryview) -> Dict:
+    if len(view) < 27:
+        raise InvalidAudioFile("Ogg file is truncated")
+
+    # First page: 27-byte header, segment table, then the codec's id header
+    segments = view[26]
+    packet = bytes(view[27 + segments:27 + segments + 64])
+
+    if packet.startswith(b"OpusHead") and len(packet) >= 19:
+        channels = packet[9]
+        pre_skip = struct.unpack_from("<H", packet, 10)[0]
+        sample_rate = struct.unpack_from("<I", packet, 12)[0] or OPUS_GRANULE_RATE
+        granule_rate, offset = OPUS_GRANULE_RATE, pre_skip
+    elif packet.startswith(b"\x01vorbis") and len(packet) >= 16:
+        channels = packet[11]
+        sample_rate = struct.unpack_from("<I", packet, 12)[0]
+        granule_rate, offset = sample_rate, 0
+    else:
+        raise InvalidAudioFile("Ogg stream is neither Opus nor Vorbis")
+
+    # The last page's granule position is the stream length in samples
+    duration = None
+    tail_start = max(len(view) - OGG_TAIL_BYTES, 0)
+    tail = bytes(view[tail_start:])
+    last_page = tail.rfind(b"OggS")
+    if last_page != -1 and last_page + 14 <= len(tail):
+        granule = struct.unpack_from("<q", tail, last_page + 6)[0]
+        if granule > 0 and granule_rate:
+            duration = max(granule - offset, 0) / granule_rate
+
+    return {"sample_rate": sample_rate, "channels": channels, "duration_seconds": duration}
+
+
+# Matroska/WebM element IDs
+EBML_SEGMENT = 0x18538067
+EBML_INFO = 0x1549A966
+EBML_TIMECODE_SCALE = 0x2AD7B1
+EBML_DURATION = 0x4489
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_AUDIO = 0xE1
+EBML_SAMPLING_FREQUENCY = 0xB5
+EBML_CHANNELS = 0x9F
+EBML_CLUSTER = 0x1F43B675
+EBML_CONTAINERS = {EBML_SEGMENT, EBML_INFO, EBML_TRACKS, EBML_TRACK_ENTRY, EBML_AUDIO}
+
+
+def _read_vint(view: memoryview, offset: int, keep_marker: bool):
+    """EBML variable-length integer; returns (value, length, all_ones)"""
+    if offset >= len(view):
+        raise InvalidAudioFile("WebM header is truncated")
+    first = view[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or offset + length > len(view):
+        raise InvalidAudioFile("WebM header has an invalid element")
+
+    value = first if keep_marker else first & (mask - 1)
+    for byte in view[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    all_ones = (first & (mask - 1)) == mask - 1 and all(b == 0xFF for b in view[offset + 1:offset + length])
+    return value, length, all_ones
+
+
+def _probe_webm(view: memoryview) -> Dict:
+    timecode_scale = 1_000_000
+    duration = None
+    sample_rate = None
+    channels = None
+
+    offset = 0
+    end = len(view)
+    while offset < end:
+        element_id, id_length, _ = _read_vint(view, offset, keep_marker=True)
+        size, size_length, unknown_size = _read_vint(view, offset + id_length, keep_marker=False)
+        body = offset + id_length + size_length
+
+        if element_id == EBML_CLUSTER:
+            # Media data starts here; everything we need comes before it
+            break
+        if element_id in EBML_CONTAINERS:
+            # Descend; unknown-size (live) elements run to the end of the file
+            offset = body
+            continue
+
+        if body + size > end and not unknown_size:
+            break
+        data = bytes(view[body:body + size])
+        if element_id == EBML_TIMECODE_SCALE and data:
+            timecode_scale = int.from_bytes(data, "big")
+        elif element_id == EBML_DURATION and size in (4, 8):
+            duration = struct.unpack(">f" if size == 4 else ">d", data)[0]
+        elif element_id == EBML_SAMPLING_FREQUENCY and size in (4, 8) and sample_rate is None:
+            sample_rate = int(struct.unpack(">f" if size == 4 else ">d", data)[0])
+        elif element_id == EBML_CHANNELS and data and channels is None:
+            channels = int.from_bytes(data, "big")
+
+        offset = body + size
+
+    if sample_rate is None:
+        raise InvalidAudioFile("WebM file has no audio track")
+
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels or 1,
+        # MediaRecorder output usually omits Duration
+        "duration_seconds": duration * timecode_scale / 1e9 if duration else None
+    }
+
+
+MP4_CONTAINERS = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+
+def _probe_mp4(view: memoryview) -> Dict:
+    result = {"sample_rate": None, "channels": None, "duration_seconds": None}
+
+    def walk(start: int, end: int):
+        offset = start
+        while offset + 8 <= end:
+            size = struct.unpack_from(">I", view, offset)[0]
+            box_type = bytes(view[offset + 4:offset + 8])
+            header = 8
+            if size == 1 and offset + 16 <= end:
+                size = struct.unpack_from(">Q", view, offset + 8)[0]
+                header = 16
+            elif size == 0:
+                size = end - offset
+            if size < header:
+                raise InvalidAudioFile("MP4 file has an invalid box")
+            body = offset + header
+            box_end = min(offset + size, end)
+
+            if box_type in MP4_CONTAINERS:
+                walk(body, box_end)
+            elif box_type == b"mvhd" and body + 32 <= box_end:
+                if view[body] == 1:
+                    timescale, duration = struct.unpack_from(">IQ", view, body + 20)
+                else:
+                    timescale, duration = struct.unpack_from(">II", view, body + 12)
+                if timescale:
+                    result["duration_seconds"] = duration / timescale
+            elif box_type == b"stsd" and body + 8 + 36 <= box_end and result["sample_rate"] is None:
+                # First sample entry: 8-byte box header, 8 reserved/reference
+                # bytes, 8 reserved, then channel count and 16.16 sample rate
+                entry = body + 8
+                channels = struct.unpack_from(">H", view, entry + 24)[0]
+                sample_rate = struct.unpack_from(">I", view, entry + 32)[0] >> 16
+                result["channels"] = channels
+                result["sample_rate"] = sample_rate
+
+            # Skipping a box (mdat included) costs nothing: it's just an offset
+            offset = offset + size
+
+    walk(0, len(view))
+    if result["sample_rate"] is None:
+        raise InvalidAudioFile("MP4 file has no audio track")
+    return result
+
+
+def _probe_mp3(view: memoryview) -> Dict:
+    # Duration needs a frame scan or Xing header; only the container is checked
+    return {"sample_rate": None, "channels": None, "duration_seconds": None}
+
+
+PROBES = {
+    "wav": _probe_wav,
+    "flac": _probe_flac,
+    "ogg": _probe_ogg,
+    "webm": _probe_webm,
+    "mp4": _probe_mp4,
+    "mp3": _probe_mp3
+}
+
+
+def probe_audio(buffer) -> Dict:
+    """Container, sample rate, channels and duration from headers only
+
+    Raises InvalidAudioFile for unknown containers, malformed headers or
+    implausible values. Fields the container doesn't record are None.
+    """
+    view = memoryview(buffer)
+    container = sniff_container(bytes(view[:12]))
+    if container is None:
+        raise InvalidAudioFile("Unrecognized audio format")
+
+    try:
+        metadata = PROBES[container](view)
+    except InvalidAudioFile:
+        raise
+    except (struct.error, IndexError, ValueError) as e:
+        raise InvalidAudioFile(f"Malformed {container} header: {str(e)}")
+
+    sample_rate = metadata["sample_rate"]
+    channels = metadata["channels"]
+    if sample_rate is not None and not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise InvalidAudioFile(f"Implausible sample rate {sample_rate} Hz")
+    if channels is not None and not 1 <= channels <= MAX_CHANNELS:
+        raise InvalidAudioFile(f"Implausible channel count {channels}")
+    if metadata["duration_seconds"] is not None and metadata["duration_seconds"] <= 0:
+        raise InvalidAudioFile("Recording is empty")
+
+    metadata["container"] = container
+    return metadata
@@ -4,57 +4,573 @@ Handles audio file processing and storage
 """
 import os
 import sys
-from typing import Optional
+import asyncio
+import hashlib
+import shutil
+import struct
+import time
+import wave
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import quote
 import io
 
+import numpy as np
+
 # Add shared directory to Python path
 shared_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared')
 if shared_dir not in sys.path:
     sys.path.append(shared_dir)
 
 from supabase_config import supabase_config
+from ingest import AudioData
+from audio_probe import WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, parse_wav_header
+
+# Archival encodings for the audio-recordings bucket. FLAC is lossless;
+# Opus at speech bitrates is several times smaller again.
+STORAGE_CODECS = {
+    "wav": {"extension": "wav", "content_type": "audio/wav", "format": None, "args": []},
+    "flac": {"extension": "flac", "content_type": "audio/flac", "format": "flac", "args": ["-c:a", "flac", "-compression_level", "5"]},
+    "opus": {
+        "extension": "ogg",
+        "content_type": "audio/ogg",
+        "format": "ogg",
+        "args": ["-c:a", "libopus", "-b:a", os.getenv("AUDIO_OPUS_BITRATE", "24k"), "-application", "voip"]
+    }
+}
+AUDIO_BUCKET = "audio-recordings"
+AUDIO_STORAGE_CODEC = os.getenv("AUDIO_STORAGE_CODEC", "flac").lower()
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+
+def ffmpeg_available() -> bool:
+    """Whether the ffmpeg binary the compressed codecs need is installed"""
+    return shutil.which(FFMPEG_BINARY) is not None
+
+# Voice activity detection: 30 ms frames, pauses longer than VAD_MAX_PAUSE
+# seconds are shortened to VAD_KEEP_PAUSE so sentence breaks survive
+VAD_FRAME_MS = 30
+VAD_MAX_PAUSE = float(os.getenv("VAD_MAX_PAUSE_SECONDS", "1.0"))
+VAD_KEEP_PAUSE = float(os.getenv("VAD_KEEP_PAUSE_SECONDS", "0.4"))
+VAD_HANGOVER_MS = 200
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true"
+
+# Whisper only needs 16 kHz mono; archival copies keep the original format
+TRANSCRIPTION_SAMPLE_RATE = int(os.getenv("TRANSCRIPTION_SAMPLE_RATE", "16000"))
+# Long recordings are transcribed as overlapping chunks cut at quiet points
+CHUNK_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_SECONDS", "30"))
+CHUNK_OVERLAP_SECONDS = float(os.getenv("TRANSCRIPTION_CHUNK_OVERLAP_SECONDS", "0.5"))
+NORMALIZE_PEAK = 0.89  # about -1 dBFS
+MAX_NORMALIZE_GAIN = 20.0
+
+# Waveform previews: min/max pairs as int8, a couple of KB per entry.
+# Header: magic, version, bucket count, sample rate, duration (seconds)
+WAVEFORM_BUCKETS = int(os.getenv("WAVEFORM_BUCKETS", "800"))
+WAVEFORM_MAGIC = b"DVWF"
+WAVEFORM_VERSION = 1
+WAVEFORM_HEADER = struct.Struct("<4sBxHIf")
+WAVEFORM_CONTENT_TYPE = "application/octet-stream"
+
+def decode_pcm(buffer: AudioData) -> Optional[Tuple[np.ndarray, int]]:
+    """Frames x channels sample array viewing the WAV data in place, plus the sample rate"""
+    info = parse_wav_header(buffer)
+    if info is None or not info["channels"]:
+        return None
+    
+    dtypes = {
+        (WAVE_FORMAT_PCM, 16): np.int16,
+        (WAVE_FORMAT_PCM, 32): np.int32,
+        (WAVE_FORMAT_IEEE_FLOAT, 32): np.float32
+    }
+    dtype = dtypes.get((info["format_tag"], info["bits_per_sample"]))
+    if dtype is None:
+        return None
+    
+    channels = info["channels"]
+    frame_bytes = np.dtype(dtype).itemsize * channels
+    frames = info["data_size"] // frame_bytes
+    samples = np.frombuffer(buffer, dtype=dtype, count=frames * channels, offset=info["data_offset"])
+    return samples.reshape(frames, channels), info["sample_rate"]
+
+def encode_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """16-bit PCM WAV bytes for a frames x channels array"""
+    if samples.dtype != np.int16:
+        peak = np.iinfo(samples.dtype).max if samples.dtype.kind == "i" else 1.0
+        scaled = samples.astype(np.float32) * np.float32(32767.0 / peak)
+        np.clip(scaled, -32768, 32767, out=scaled)
+        samples = scaled.astype(np.int16)
+        del scaled
+    
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.ascontiguousarray(samples))
+    return out.getvalue()
+
+def frame_features(samples: np.ndarray, frame_length: int, block_frames: int = 2048) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-frame RMS level (dBFS) and zero-crossing rate of a frames x channels array
+    
+    Works through the signal in blocks so the float32 working set stays
+    bounded no matter how long the recording is.
+    """
+    frame_count = samples.shape[0] // frame_length
+    scale = float(np.iinfo(samples.dtype).max) if samples.dtype.kind == "i" else 1.0
+    energy_db = np.empty(frame_count, dtype=np.float32)
+    zcr = np.empty(frame_count, dtype=np.float32)
+    
+    for start in range(0, frame_count, block_frames):
+        stop = min(start + block_frames, frame_count)
+        block = samples[start * frame_length:stop * frame_length]
+        mono = block.mean(axis=1, dtype=np.float32) / scale
+        frames = mono.reshape(stop - start, frame_length)
+        
+        rms = np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_length)
+        energy_db[start:stop] = 20.0 * np.log10(np.maximum(rms, 1e-6))
+        
+        signs = np.signbit(frames)
+        zcr[start:stop] = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame_length
+    
+    return energy_db, zcr
+
+def detect_speech(energy_db: np.ndarray, zcr: np.ndarray, hangover_frames: int) -> np.ndarray:
+    """Boolean speech mask per frame from energy and zero-crossing rate"""
+    if energy_db.size == 0:
+        return np.zeros(0, dtype=bool)
+    
+    # Threshold relative to the recording's own noise floor
+    noise_floor = np.percentile(energy_db, 10)
+    loud = energy_db > max(noise_floor + 12.0, -55.0)
+    # Quieter unvoiced sounds (s, f, sh) show up as a high crossing rate
+    fricative = (energy_db > max(noise_floor + 6.0, -60.0)) & (zcr > 0.3)
+    speech = loud | fricative
+    
+    # Hold speech for a short hangover so word onsets/endings aren't clipped
+    if hangover_frames > 0:
+        kernel = np.ones(2 * hangover_frames + 1, dtype=np.int32)
+        speech = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+    return speech
+
+def keep_mask(speech: np.ndarray, max_pause_frames: int, keep_pause_frames: int) -> np.ndarray:
+    """Frames to keep: drop leading/trailing silence, shorten long pauses"""
+    keep = speech.copy()
+    voiced = np.flatnonzero(speech)
+    if voiced.size == 0:
+        return keep
+    
+    # Silent runs between the first and last voiced frame
+    first, last = voiced[0], voiced[-1]
+    inner = ~speech[first:last + 1]
+    edges = np.diff(np.concatenate(([0], inner.astype(np.int8), [0])))
+    run_starts = np.flatnonzero(edges == 1) + first
+    run_ends = np.flatnonzero(edges == -1) + first
+    
+    for run_start, run_end in zip(run_starts, run_ends):
+        if run_end - run_start > max_pause_frames:
+            # Keep a short pause, split around the middle of the gap
+            half = keep_pause_frames // 2
+            keep[run_start:run_start + half] = True
+            keep[run_end - (keep_pause_frames - half):run_end] = True
+        else:
+            keep[run_start:run_end] = True
+    return keep
+
+def trim_samples(
+    samples: np.ndarray,
+    sample_rate: int,
+    max_pause: float = VAD_MAX_PAUSE,
+    keep_pause: float = VAD_KEEP_PAUSE
+) -> Optional[Dict]:
+    """Remove leading/trailing silence and compress long pauses
+    
+    Returns the kept samples, the seconds removed, and `segments` mapping
+    each kept stretch back to the original recording: output_start,
+    original_start and duration, all in seconds. Returns None when no speech
+    is found, so callers keep the audio untouched.
+    """
+    frame_length = max(int(sample_rate * VAD_FRAME_MS / 1000), 1)
+    frame_seconds = frame_length / sample_rate
+    energy_db, zcr = frame_features(samples, frame_length)
+    speech = detect_speech(energy_db, zcr, int(VAD_HANGOVER_MS / VAD_FRAME_MS))
+    if not speech.any():
+        return None
+    
+    keep = keep_mask(speech, int(max_pause / frame_seconds), int(keep_pause / frame_seconds))
+    edges = np.diff(np.concatenate(([0], keep.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    
+    segments: List[Dict] = []
+    pieces = []
+    output_start = 0.0
+    for start, end in zip(starts, ends):
+        pieces.append(samples[start * frame_length:end * frame_length])
+        duration = (end - start) * frame_seconds
+        segments.append({
+            "output_start": round(float(output_start), 3),
+            "original_start": round(float(start * frame_seconds), 3),
+            "duration": round(float(duration), 3)
+        })
+        output_start += duration
+    
+    trimmed = np.concatenate(pieces)
+    original_seconds = samples.shape[0] / sample_rate
+    return {
+        "samples": trimmed,
+        "removed_seconds": round(float(original_seconds - trimmed.shape[0] / sample_rate), 3),
+        "original_seconds": round(float(original_seconds), 3),
+        "segments": segments
+    }
+
+def split_at_silence(
+    samples: np.ndarray,
+    sample_rate: int,
+    chunk_seconds: float = CHUNK_SECONDS,
+    overlap_seconds: float = CHUNK_OVERLAP_SECONDS,
+    search_seconds: float = 5.0
+) -> List[Tuple[int, int]]:
+    """Sample ranges of roughly `chunk_seconds` for parallel transcription
+    
+    Each cut goes at the quietest frame within `search_seconds` of the
+    target length, so words are rarely split, and every range is widened by
+    `overlap_seconds` on both sides; the transcripts' overlap is removed
+    again when they are stitched. Short audio comes back as one range.
+    """
+    total = samples.shape[0]
+    chunk = int(chunk_seconds * sample_rate)
+    if chunk <= 0 or total <= chunk * 1.5:
+        return [(0, total)]
+    
+    frame_length = max(int(sample_rate * VAD_FRAME_MS / 1000), 1)
+    energy_db, _ = frame_features(samples, frame_length)
+    search = int(search_seconds * sample_rate / frame_length)
+    
+    cuts = [0]
+    while total - cuts[-1] > chunk * 1.5:
+        target = (cuts[-1] + chunk) // frame_length
+        lo = max(target - search, cuts[-1] // frame_length + 1)
+        hi = min(target + search, energy_db.shape[0])
+        quietest = lo + int(np.argmin(energy_db[lo:hi]))
+        cuts.append(quietest * frame_length + frame_length // 2)
+    cuts.append(total)
+    
+    pad = int(overlap_seconds * sample_rate)
+    return [(max(start - pad, 0), min(end + pad, total)) for start, end in zip(cuts, cuts[1:])]
+
+def lowpass_taps(cutoff: float, num_taps: int = 63) -> np.ndarray:
+    """Hann-windowed sinc low-pass; `cutoff` is a fraction of the sample rate"""
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hanning(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+def to_speech_pcm(
+    samples: np.ndarray,
+    sample_rate: int,
+    target_rate: int = TRANSCRIPTION_SAMPLE_RATE,
+    block_seconds: float = 10.0
+) -> Tuple[np.ndarray, int]:
+    """Downmix, resample and peak-normalize in one pass over the input
+    
+    `samples` is usually a zero-copy view of the upload (see decode_pcm).
+    Each block is converted to float32 mono, low-pass filtered and
+    interpolated straight into the preallocated output, so the working set
+    is one block plus the compact 16 kHz result, never a float copy of the
+    whole recording. Returns a frames x 1 float32 array and its rate.
+    """
+    target_rate = min(target_rate, sample_rate)
+    ratio = sample_rate / target_rate
+    scale = float(np.iinfo(samples.dtype).max) if samples.dtype.kind == "i" else 1.0
+    
+    total_in = samples.shape[0]
+    total_out = int(total_in / ratio)
+    out = np.empty(total_out, dtype=np.float32)
+    
+    # Anti-aliasing filter just below the new Nyquist frequency
+    taps = lowpass_taps(0.45 / ratio) if ratio > 1 else None
+    context = len(taps) // 2 + 1 if taps is not None else 1
+    block = max(int(sample_rate * block_seconds), 1)
+    
+    for start in range(0, total_in, block):
+        stop = min(start + block, total_in)
+        out_start = int(np.ceil(start / ratio))
+        out_stop = min(int(np.ceil(stop / ratio)), total_out)
+        if out_start >= out_stop:
+            continue
+        
+        # Read a little either side so filtering and interpolation are seamless
+        lo = max(start - context, 0)
+        hi = min(stop + context, total_in)
+        mono = samples[lo:hi].mean(axis=1, dtype=np.float32)
+        if taps is not None:
+            mono = np.convolve(mono, taps, mode="same")
+        
+        positions = np.arange(out_start, out_stop, dtype=np.float64) * ratio - lo
+        out[out_start:out_stop] = np.interp(positions, np.arange(mono.shape[0]), mono)
+    
+    # Peak-normalize; cap the gain so near-silent takes aren't blown up into noise
+    out *= 1.0 / scale
+    peak = float(np.abs(out).max()) if total_out else 0.0
+    if peak > 0:
+        out *= min(NORMALIZE_PEAK / peak, MAX_NORMALIZE_GAIN)
+    
+    return out.reshape(-1, 1), target_rate
+
+def to_original_time(seconds: float, segments: List[Dict]) -> float:
+    """Map a timestamp in trimmed audio (e.g. from Whisper) back to the recording"""
+    for segment in reversed(segments):
+        if seconds >= segment["output_start"]:
+            offset = min(seconds - segment["output_start"], segment["duration"])
+            return segment["original_start"] + offset
+    return seconds
+
+def waveform_peaks(samples: np.ndarray, buckets: int = WAVEFORM_BUCKETS) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-bucket minimum and maximum across all channels, scaled to int8
+    
+    Works on the decoded frames x channels view directly: each bucket is a
+    reshaped slice, so there's no downmix or float copy of the recording.
+    """
+    frames = samples.shape[0]
+    buckets = max(min(buckets, frames), 1)
+    per_bucket = frames // buckets
+    if per_bucket == 0:
+        return np.zeros(1, dtype=np.int8), np.zeros(1, dtype=np.int8)
+    
+    blocks = samples[:buckets * per_bucket].reshape(buckets, -1)
+    mins = blocks.min(axis=1).astype(np.float32)
+    maxs = blocks.max(axis=1).astype(np.float32)
+    
+    full_scale = np.iinfo(samples.dtype).max if samples.dtype.kind == "i" else 1.0
+    scale = np.float32(127.0 / full_scale)
+    to_int8 = lambda values: np.clip(np.round(values * scale), -127, 127).astype(np.int8)
+    return to_int8(mins), to_int8(maxs)
+
+def encode_peaks(buffer: AudioData, buckets: int = WAVEFORM_BUCKETS) -> Optional[bytes]:
+    """Compact binary waveform for a WAV buffer, or None if it can't be decoded here"""
+    decoded = decode_pcm(buffer)
+    if decoded is None or decoded[0].shape[0] == 0:
+        return None
+    
+    samples, sample_rate = decoded
+    mins, maxs = waveform_peaks(samples, buckets)
+    pairs = np.empty(mins.size * 2, dtype=np.int8)
+    pairs[0::2] = mins
+    pairs[1::2] = maxs
+    
+    header = WAVEFORM_HEADER.pack(
+        WAVEFORM_MAGIC, WAVEFORM_VERSION, mins.size, sample_rate, samples.shape[0] / sample_rate
+    )
+    return header + pairs.tobytes()
+
+def prepare_audio(audio_data: AudioData) -> Dict:
+    """Build the compact payload sent to Whisper
+    
+    PCM WAV is decoded in place, downmixed, resampled to 16 kHz mono and
+    peak-normalized, then trimmed of silence (Whisper bills per second).
+    Long recordings are also cut at quiet points into overlapping
+    `chunks` that can be transcribed in parallel. Audio that can't be
+    decoded here (compressed uploads) passes through unchanged. The
+    archival copy is stored separately from the spool file. Pure CPU work
+    with no I/O, so it can run in a worker process (see audio_workers).
+    """
+    decoded = decode_pcm(audio_data)
+    if decoded is None:
+        return {
+            "audio": audio_data,
+            "content_type": None,
+            "removed_seconds": 0.0,
+            "segments": None,
+            "chunks": None
+        }
+    
+    samples, sample_rate = to_speech_pcm(*decoded)
+    del decoded
+    
+    trimmed = trim_samples(samples, sample_rate) if VAD_ENABLED else None
+    if trimmed is None:
+        result = {"removed_seconds": 0.0, "segments": None}
+    else:
+        samples = trimmed.pop("samples")
+        result = trimmed
+    
+    ranges = split_at_silence(samples, sample_rate)
+    result["audio"] = encode_wav(samples, sample_rate)
+    result["content_type"] = "audio/wav"
+    result["chunks"] = [
+        encode_wav(samples[start:end], sample_rate) for start, end in ranges
+    ] if len(ranges) > 1 else None
+    return result
 
 class AudioProcessor:
-    def __init__(self):
-        self.client = supabase_config.get_client()
-    
-    def process_audio(self, audio_data: bytes) -> bytes:
-        """Process raw audio data"""
-        # For now, just return the data as-is
-        # In the future, you could add:
-        # - Format conversion
-        # - Noise reduction
-        # - Volume normalization
-        return audio_data
-    
-    async def save_to_storage(self, audio_data: bytes, file_path: str) -> str:
-        """Save audio file to Supabase Storage"""
+    def __init__(self, storage_codec: str = AUDIO_STORAGE_CODEC):
+        self.client = supabase_config.get_service_client()
+        if storage_codec not in STORAGE_CODECS:
+            raise ValueError(f"Unknown AUDIO_STORAGE_CODEC '{storage_codec}'")
+        if STORAGE_CODECS[storage_codec]["format"] is not None and not ffmpeg_available():
+            # Without ffmpeg every upload would fail its encode; store originals instead
+            print(f"{FFMPEG_BINARY} not found: storing recordings as uploaded instead of {storage_codec}")
+            storage_codec = "wav"
+        self.storage_codec = storage_codec
+        
+        # Running totals so encode cost can be weighed against bytes saved
+        self.transcode_stats = {
+            "codec": storage_codec,
+            "files": 0,
+            "failures": 0,
+            "input_bytes": 0,
+            "output_bytes": 0,
+            "encode_seconds": 0.0
+        }
+    
+    async def transcode_for_storage(self, source_path: str, codec_name: Optional[str] = None) -> Optional[Dict]:
+        """Encode a spooled recording with the deployment's storage codec
+        
+        Runs ffmpeg as a subprocess, so encoding never blocks the event loop.
+        Returns the encoded file's path, extension and content type, or None
+        if the original should be stored as-is (codec "wav" or encode failure).
+        `codec_name` overrides the configured codec.
+        """
+        codec_name = codec_name or self.storage_codec
+        codec = STORAGE_CODECS[codec_name]
+        if codec["format"] is None:
+            return None
+        
+        target_path = f"{source_path}.{codec['extension']}"
+        started = time.perf_counter()
         try:
-            # Upload to Supabase Storage
-            result = self.client.storage.from_("audio-recordings").upload(
-                file_path, 
-                audio_data,
-                {"content-type": "audio/wav"}
+            process = await asyncio.create_subprocess_exec(
+                FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-i", source_path, "-vn", *codec["args"], "-f", codec["format"], target_path,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
             )
-            
-            if result.error:
-                raise Exception(f"Storage upload failed: {result.error}")
-            
-            # Get public URL
-            public_url = self.client.storage.from_("audio-recordings").get_public_url(file_path)
-            
-            return public_url
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise Exception(stderr.decode(errors="replace").strip() or f"exit code {process.returncode}")
+        except asyncio.CancelledError:
+            self._remove(target_path)
+            raise
+        except Exception as e:
+            # Fall back to storing the original rather than failing the upload
+            self.transcode_stats["failures"] += 1
+            self._remove(target_path)
+            print(f"Transcoding to {codec_name} failed, storing original: {str(e)}")
+            return None
+        
+        self.transcode_stats["files"] += 1
+        self.transcode_stats["input_bytes"] += os.path.getsize(source_path)
+        self.transcode_stats["output_bytes"] += os.path.getsize(target_path)
+        self.transcode_stats["encode_seconds"] += time.perf_counter() - started
+        
+        return {
+            "path": target_path,
+            "extension": codec["extension"],
+            "content_type": codec["content_type"]
+        }
+    
+    async def archive_recording(self, source_path: str, storage_key: str, content_type: str, extension: str) -> Dict:
+        """Transcode (if configured) and upload a recording
+        
+        `storage_key` is the object path without an extension. Returns the
+        object `url`, storage `path`, `content_type` and stored `size`.
+        """
+        encoded = await self.transcode_for_storage(source_path)
+        if encoded is None:
+            encoded = {"path": source_path, "extension": extension, "content_type": content_type}
+        
+        object_path = f"{storage_key}.{encoded['extension']}"
+        try:
+            url = await self.save_to_storage(encoded["path"], object_path, encoded["content_type"])
+            return {
+                "url": url,
+                "path": object_path,
+                "content_type": encoded["content_type"],
+                "size": os.path.getsize(encoded["path"])
+            }
+        finally:
+            if encoded["path"] != source_path:
+                self._remove(encoded["path"])
+    
+    def object_url(self, path: str, bucket: str = AUDIO_BUCKET) -> str:
+        """Authenticated storage URL for an object; the bucket is private, so
+        it only resolves with the service role (see /api/entries/{id}/audio)"""
+        return f"{supabase_config.url.rstrip('/')}/storage/v1/object/authenticated/{bucket}/{quote(path)}"
+    
+    async def remove_from_storage(self, path: str, bucket: str = AUDIO_BUCKET) -> None:
+        try:
+            await asyncio.to_thread(self.client.storage.from_(bucket).remove, [path])
+        except Exception as e:
+            raise Exception(f"Failed to remove {bucket}/{path}: {str(e)}")
+    
+    def get_transcode_stats(self) -> Dict:
+        stats = dict(self.transcode_stats)
+        if stats["input_bytes"]:
+            stats["compression_ratio"] = round(stats["input_bytes"] / max(stats["output_bytes"], 1), 2)
+            stats["bytes_saved"] = stats["input_bytes"] - stats["output_bytes"]
+        if stats["files"]:
+            stats["avg_encode_ms"] = round(stats["encode_seconds"] * 1000 / stats["files"], 1)
+        return stats
+    
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    async def save_to_storage(
+        self,
+        audio_data: Union[bytes, str],
+        file_path: str,
+        content_type: str = "audio/wav",
+        bucket: str = AUDIO_BUCKET
+    ) -> str:
+        """Save audio file to Supabase Storage
+
+        `audio_data` may be raw bytes or the path of a local file, which the
+        storage client streams from disk instead of loading into memory.
+        """
+        try:
+            # The storage client is synchronous, so keep it off the event loop
+            return await asyncio.to_thread(self._upload, audio_data, file_path, content_type, bucket)
             
         except Exception as e:
             raise Exception(f"Failed to save audio: {str(e)}")
     
-    def validate_audio_file(self, file_data: bytes, max_size_mb: int = 10) -> bool:
-        """Validate audio file size and format"""
+    def _upload(self, audio_data: Union[bytes, str], file_path: str, content_type: str, bucket: str = AUDIO_BUCKET) -> str:
+        """Blocking upload to Supabase Storage"""
+        # Upload to Supabase Storage
+        result = self.client.storage.from_(bucket).upload(
+            file_path, 
+            audio_data,
+            # Content-addressed paths may be written twice by racing uploads
+            {"content-type": content_type, "upsert": "true"}
+        )
         
-        # Check file size
-        file_size_mb = len(file_data) / (1024 * 1024)
-        if file_size_mb > max_size_mb:
-            return False
+        if getattr(result, "error", None):
+            raise Exception(f"Storage upload failed: {result.error}")
         
-        # Basic file validation (you could add more sophisticated checks)
-        return len(file_data) > 0
+        return self.object_url(file_path, bucket)
+    
+    async def save_waveform(self, peaks: bytes) -> str:
+        """Upload waveform peaks; returns the storage path
+        
+        Paths are content-addressed, so a stored waveform never changes and
+        the hash doubles as its ETag.
+        """
+        path = f"waveforms/{hashlib.sha256(peaks).hexdigest()[:32]}.peaks"
+        try:
+            await asyncio.to_thread(
+                self.client.storage.from_(AUDIO_BUCKET).upload,
+                path,
+                peaks,
+                {"content-type": WAVEFORM_CONTENT_TYPE, "upsert": "true"}
+            )
+        except Exception as e:
+            raise Exception(f"Failed to save waveform: {str(e)}")
+        return path
+    
+    async def load_waveform(self, path: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self.client.storage.from_(AUDIO_BUCKET).download, path)
+        except Exception as e:
+            raise Exception(f"Failed to load waveform: {str(e)}")
@@ -0,0 +1,173 @@
+"""
+Audio Worker Pool for DayVibe
+Runs CPU-heavy DSP (decode, resample, VAD, encode) in a bounded process pool
+so it never blocks the event loop serving the rest of the API
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional
+
+from audio_processor import encode_peaks, prepare_audio
+from ingest import SpooledAudio
+from transcription_cache import audio_hash
+
+# Processes per API worker; 0 runs audio work on a thread instead
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", str(min(os.cpu_count() or 1, 4))))
+# Calls admitted at once; further callers wait instead of piling up in the pool
+AUDIO_MAX_PENDING = int(os.getenv("AUDIO_MAX_PENDING", "32"))
+
+
+def prepare_file(source_path: str, output_path: Optional[str] = None) -> Dict:
+    """Worker-side prepare_audio on a spooled recording.
+
+    Audio moves through files rather than pickles: the worker memory-maps
+    the spool file and, when `output_path` is given, writes the prepared
+    WAV and its chunks back-to-back into it. Only offsets and metadata
+    travel over the pipe; the parent maps the output file to read them.
+    """
+    with SpooledAudio(source_path) as source:
+        prepared = prepare_audio(source.buffer)
+        audio = prepared.pop("audio")
+        chunks = prepared.pop("chunks")
+
+        if output_path is None or prepared["content_type"] is None:
+            # Metadata only, or passed through: the spool file is the payload
+            prepared["output_path"] = None
+            del audio
+            return prepared
+
+        ranges = []
+        offset = 0
+        with open(output_path, "wb") as f:
+            for part in [audio] + (chunks or []):
+                f.write(part)
+                ranges.append((offset, len(part)))
+                offset += len(part)
+
+    prepared["output_path"] = output_path
+    prepared["audio_range"] = ranges[0]
+    prepared["chunk_ranges"] = ranges[1:] or None
+    return prepared
+
+
+def hash_file(source_path: str) -> str:
+    """SHA-256 of a spooled recording, read through its memory map.
+
+    The upload's identity: it keys the transcript cache and the
+    content-addressed blob, and costs one sequential read, not a DSP pass.
+    """
+    with SpooledAudio(source_path) as source:
+        return audio_hash(source.buffer)
+
+
+def waveform_file(source_path: str) -> Optional[bytes]:
+    """Worker-side encode_peaks on a spooled recording; the result is a few KB"""
+    with SpooledAudio(source_path) as source:
+        return encode_peaks(source.buffer)
+
+
+class AudioWorkerPool:
+    """Bounded process pool for audio preparation, with queue-depth stats"""
+
+    def __init__(self, max_workers: int = AUDIO_WORKERS, max_pending: int = AUDIO_MAX_PENDING):
+        self.max_workers = max_workers
+        self.max_pending = max(max_pending, 1)
+        self.pending = 0  # waiting for admission
+        self.active = 0  # admitted: running or queued inside the executor
+        self.completed = 0
+        self.restarts = 0
+        self._admission = asyncio.Semaphore(self.max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self._executor is None and self.max_workers > 0:
+            # forkserver: workers are forked from a clean single-threaded
+            # process, not from this one with its event loop and threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context(method)
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _replace(self, broken: ProcessPoolExecutor) -> None:
+        """Swap out a pool a dead worker has broken; callers that saw the
+        same breakage replace it only once"""
+        if self._executor is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self.restarts += 1
+            self.start()
+
+    async def run(self, func, *args):
+        """Run a picklable module-level function in the pool"""
+        self.pending += 1
+        try:
+            await self._admission.acquire()
+        finally:
+            self.pending -= 1
+
+        self.active += 1
+        try:
+            if self.max_workers <= 0:
+                return await asyncio.to_thread(func, *args)
+            self.start()
+            loop = asyncio.get_running_loop()
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(executor, func, *args)
+            except BrokenProcessPool:
+                # A worker was killed (OOM, native crash) and took every call
+                # in the pool with it. Retry once on a fresh pool; a second
+                # failure fails just this call
+                self._replace(executor)
+                return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._admission.release()
+
+    async def prepare(self, source_path: str, output_path: Optional[str] = None) -> Dict:
+        """prepare_audio for a spool file, run in the pool.
+
+        With `output_path`, `audio` and `chunks` in the result are zero-copy
+        views of the prepared file (or of the spool file when the upload
+        was passed through), and `file` is the mapping to close when done.
+        """
+        prepared = await self.run(prepare_file, source_path, output_path)
+        if output_path is None:
+            return prepared
+
+        mapped = SpooledAudio(prepared["output_path"] or source_path)
+        view = mapped.buffer
+        if prepared["output_path"] is None:
+            prepared["audio"] = view
+            prepared["chunks"] = None
+        else:
+            start, length = prepared.pop("audio_range")
+            prepared["audio"] = view[start:start + length]
+            chunk_ranges = prepared.pop("chunk_ranges")
+            prepared["chunks"] = [
+                view[start:start + length] for start, length in chunk_ranges
+            ] if chunk_ranges else None
+        prepared["file"] = mapped
+        return prepared
+
+    def stats(self) -> Dict:
+        """Pool size and queue depth for this API worker"""
+        slots = max(self.max_workers, 1)
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "running": min(self.active, slots),
+            "queued": self.pending + max(self.active - slots, 0),
+            "completed": self.completed,
+            "restarts": self.restarts
+        }
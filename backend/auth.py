@@ -0,0 +1,97 @@
+"""
+Request Authentication for DayVibe
+Resolves Supabase access tokens to user ids for per-user access checks
+"""
+import hashlib
+import hmac
+import os
+import sys
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import Depends, Header, HTTPException, Request
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+# Add shared directory to Python path
+shared_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared')
+if shared_dir not in sys.path:
+    sys.path.append(shared_dir)
+
+from supabase_config import supabase_config
+
+# Verified tokens are remembered briefly: a seeking audio element sends a
+# burst of Range requests with the same token
+AUTH_CACHE_SECONDS = float(os.getenv("AUTH_CACHE_SECONDS", "60"))
+AUTH_CACHE_MAX_ENTRIES = 10000
+AUTH_TIMEOUT = float(os.getenv("AUTH_TIMEOUT_SECONDS", "5"))
+# Operator endpoints take this in an X-Admin-Token header; unset, they're disabled
+ADMIN_API_TOKEN = os.getenv("ADMIN_API_TOKEN")
+
+
+class SupabaseAuth:
+    def __init__(self, url: str, key: str):
+        self.client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/auth/v1",
+            headers={"apikey": key},
+            timeout=AUTH_TIMEOUT
+        )
+        self._cache: Dict[str, Tuple[str, float]] = {}
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def user_id(self, token: str) -> Optional[str]:
+        """User id for a valid access token, or None if it's invalid or expired"""
+        key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+        now = time.monotonic()
+        cached = self._cache.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+
+        response = await self.client.get("/user", headers={"Authorization": f"Bearer {token}"})
+        if response.status_code in (401, 403):
+            return None
+        response.raise_for_status()
+
+        if len(self._cache) >= AUTH_CACHE_MAX_ENTRIES:
+            self._cache = {k: v for k, v in self._cache.items() if v[1] > now}
+            if len(self._cache) >= AUTH_CACHE_MAX_ENTRIES:
+                self._cache.clear()
+        user_id = response.json()["id"]
+        self._cache[key] = (user_id, now + AUTH_CACHE_SECONDS)
+        return user_id
+
+
+supabase_auth = SupabaseAuth(supabase_config.url, supabase_config.key)
+bearer = HTTPBearer(auto_error=False)
+
+
+async def current_user_id(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)
+) -> str:
+    """FastAPI dependency: the authenticated user's id
+
+    Takes the usual Bearer header, or an `access_token` query parameter for
+    clients such as <audio> elements that can't set headers.
+    """
+    token = credentials.credentials if credentials else request.query_params.get("access_token")
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        user_id = await supabase_auth.user_id(token)
+    except httpx.HTTPError as e:
+        raise HTTPException(status_code=503, detail=f"Auth service unavailable: {str(e) or type(e).__name__}")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token", headers={"WWW-Authenticate": "Bearer"})
+    return user_id
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """FastAPI dependency for operator-only endpoints"""
+    if not ADMIN_API_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token.encode("utf-8"), ADMIN_API_TOKEN.encode("utf-8")):
+        raise HTTPException(status_code=403, detail="Not allowed")
@@ -0,0 +1,131 @@
+"""
+Request Hedging for DayVibe
+Sends a backup copy of a slow request once it's past the usual latency, and
+keeps whichever answer arrives first
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+class LatencyHistogram:
+    """Latencies of the most recent first attempts"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile, or None until there are enough samples"""
+        if len(self.samples) < self.min_samples:
+            return None
+        return float(np.percentile(np.fromiter(self.samples, dtype=float), p))
+
+
+class HedgeBudget:
+    """Caps hedges at a fraction of requests.
+
+    Every request earns `max_rate` of a hedge and each hedge spends one, so
+    over any stretch of traffic hedges add at most `max_rate` extra calls
+    (plus a small burst allowance).
+    """
+
+    def __init__(self, max_rate: float = 0.1, burst: float = 5.0):
+        self.max_rate = max_rate
+        self.burst = burst
+        self.tokens = burst
+
+    def earn(self) -> None:
+        self.tokens = min(self.tokens + self.max_rate, self.burst)
+
+    def spend(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class Hedger:
+    """Runs calls with a percentile-based hedge and tracks the outcome"""
+
+    def __init__(self, percentile: float = 95.0, max_rate: float = 0.1, window: int = 200, min_samples: int = 20):
+        self.percentile = percentile
+        self.histogram = LatencyHistogram(window, min_samples)
+        self.budget = HedgeBudget(max_rate)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def _timed(self, call: Callable[[], Awaitable[T]]) -> T:
+        """`call()`, recording its latency, or how long it ran if it lost to a hedge.
+
+        A cancelled attempt's elapsed time is a lower bound, but leaving it
+        out would drop exactly the slow calls and pull the percentile down.
+        """
+        started = time.perf_counter()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            self.histogram.record(time.perf_counter() - started)
+            raise
+        self.histogram.record(time.perf_counter() - started)
+        return result
+
+    async def run(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Await `call()`; if it outlives the latency percentile, race a second `call()`
+
+        `call` must build a fresh request each time it's invoked. The loser
+        is cancelled. If one attempt fails, the other is still awaited.
+        """
+        self.requests += 1
+        self.budget.earn()
+
+        primary = asyncio.create_task(self._timed(call))
+        delay = self.histogram.percentile(self.percentile)
+        if delay is None:
+            return await primary
+
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.budget.spend():
+                return await primary
+
+            self.hedges += 1
+            # Only first attempts are timed: a hedge is seen only when it wins
+            hedge = asyncio.ensure_future(call())
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict:
+        p50 = self.histogram.percentile(50)
+        delay = self.histogram.percentile(self.percentile)
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": round(self.hedges / self.requests, 3) if self.requests else 0.0,
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "hedge_delay_seconds": round(delay, 3) if delay is not None else None
+        }
@@ -0,0 +1,222 @@
+"""
+Upload Ingestion for DayVibe
+Streams uploads to disk in chunks and enforces the size limit as bytes arrive
+"""
+import io
+import json
+import mmap
+import os
+from typing import Optional, Union
+
+from fastapi import UploadFile
+
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "10"))
+CHUNK_SIZE = 256 * 1024
+
+# Room for multipart boundaries and part headers around the audio itself
+MULTIPART_SLACK = 64 * 1024
+
+
+# Raw bytes, or a zero-copy view such as a memory-mapped spool file
+AudioData = Union[bytes, memoryview]
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+class SpooledAudio:
+    """Audio spooled to a file and exposed as a read-only memory map.
+
+    `buffer` is a zero-copy view of the file, so downstream stages can read
+    it (or hand `path` to clients that stream from disk) without holding
+    another copy of the recording in memory.
+    """
+
+    def __init__(self, path: str, size: Optional[int] = None):
+        self.path = path
+        self.size = os.path.getsize(path) if size is None else size
+        self._file = None
+        self._map = None
+
+    @property
+    def buffer(self) -> memoryview:
+        if self._map is None:
+            if self.size == 0:
+                return memoryview(b"")
+            self._file = open(self.path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A caller still holds a view; the map is released with it
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Close and delete the spool file"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a bytes-like buffer.
+
+    Lets HTTP clients that expect a file stream a memoryview (for example a
+    memory-mapped spool file) chunk by chunk, without copying the whole
+    buffer or writing it to a temporary file first.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._pos + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self._pos = position
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+async def spool_upload(
+    upload: UploadFile,
+    path: str,
+    max_size_mb: float = MAX_UPLOAD_MB,
+    chunk_size: int = CHUNK_SIZE
+) -> SpooledAudio:
+    """Copy an upload to `path` chunk by chunk, stopping at the size limit"""
+    max_bytes = int(max_size_mb * 1024 * 1024)
+    size = 0
+
+    try:
+        with open(path, "wb") as f:
+            while True:
+                chunk = await upload.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Audio file exceeds {max_size_mb:g} MB limit")
+                f.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    return SpooledAudio(path, size)
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware that rejects oversized upload bodies early.
+
+    Requests declaring a too-large Content-Length are refused before any of
+    the body is read; chunked bodies are cut off as soon as the running
+    byte count passes the limit, instead of after buffering the whole file.
+    """
+
+    def __init__(self, app, paths, max_size_mb: float = MAX_UPLOAD_MB):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = int(max_size_mb * 1024 * 1024) + MULTIPART_SLACK
+        self.max_size_mb = max_size_mb
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise UploadTooLarge(f"Audio file exceeds {self.max_size_mb:g} MB limit")
+            return message
+
+        async def guarded_send(message):
+            nonlocal rejected
+            if exceeded:
+                # The body parser turns our error into its own response;
+                # replace it with a 413 and drop whatever it was sending
+                if not rejected and message["type"] == "http.response.start":
+                    rejected = True
+                    await self._reject(send)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            if not rejected:
+                rejected = True
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Audio file exceeds {self.max_size_mb:g} MB limit"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close")
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,414 @@
+"""
+Background Job Queue for DayVibe
+Durable SQLite-backed queue and async worker pool for slow AI work
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+DATA_DIR = os.getenv("DAYVIBE_DATA_DIR", os.path.join(os.path.dirname(__file__), "data"))
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(DATA_DIR, "jobs.db"))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    entry_id TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 5,
+    run_after REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    dedupe_key TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, run_after);
+CREATE INDEX IF NOT EXISTS idx_jobs_entry ON jobs(entry_id);
+"""
+
+# At most one queued or running job per dedupe key
+DEDUPE_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key)
+WHERE dedupe_key IS NOT NULL AND status IN ('queued', 'running');
+"""
+
+
+class JobQueue:
+    """Durable job journal.
+
+    A job is claimed with a lease. Workers extend the lease while they run
+    and mark the job done when the handler returns, so a job whose worker
+    died (crash, redeploy) becomes claimable again once its lease expires.
+    That gives at-least-once delivery; handlers must be idempotent.
+    """
+
+    def __init__(self, db_path: str = JOB_DB_PATH, lease_seconds: float = 300.0):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._notify = asyncio.Event()
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Bring journals created by older versions up to the current schema"""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "dedupe_key" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN dedupe_key TEXT")
+        self._conn.executescript(DEDUPE_INDEX)
+
+    # -- synchronous primitives (run via asyncio.to_thread) --
+
+    def _enqueue(
+        self,
+        kind: str,
+        payload: Dict,
+        entry_id: Optional[str],
+        max_attempts: int,
+        dedupe_key: Optional[str]
+    ) -> str:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, kind, entry_id, payload, status, max_attempts, run_after, dedupe_key, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, entry_id, json.dumps(payload), QUEUED, max_attempts, now, dedupe_key, now, now)
+                )
+            except sqlite3.IntegrityError:
+                # An identical job is already in flight; hand back that one
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)",
+                    (dedupe_key, QUEUED, RUNNING)
+                ).fetchone()
+                if row is None:
+                    raise
+                return row["id"]
+        return job_id
+
+    def _claim(self, kinds: List[str]) -> Optional[Dict]:
+        now = time.time()
+        placeholders = ",".join("?" for _ in kinds)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Queued jobs that are due, plus running jobs whose lease expired
+                row = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND "
+                    "((status = ? AND run_after <= ?) OR (status = ? AND lease_until < ?)) "
+                    "ORDER BY run_after LIMIT 1",
+                    (*kinds, QUEUED, now, RUNNING, now)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, now + self.lease_seconds, now, row["id"])
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        job = dict(row)
+        job["status"] = RUNNING
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def _acquire(
+        self,
+        kind: str,
+        payload: Dict,
+        dedupe_key: str,
+        entry_id: Optional[str],
+        max_attempts: int
+    ) -> Tuple[Dict, bool]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND status IN (?, ?)",
+                    (dedupe_key, QUEUED, RUNNING)
+                ).fetchone()
+                if row is not None and row["status"] == RUNNING and row["lease_until"] >= now:
+                    # Someone else is working on it and their lease is live
+                    self._conn.execute("COMMIT")
+                    return self._public(row), False
+
+                if row is None:
+                    job_id = uuid.uuid4().hex
+                    self._conn.execute(
+                        "INSERT INTO jobs (id, kind, entry_id, payload, status, attempts, max_attempts, run_after, lease_until, dedupe_key, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?)",
+                        (job_id, kind, entry_id, json.dumps(payload), RUNNING, max_attempts, now, now + self.lease_seconds, dedupe_key, now, now)
+                    )
+                else:
+                    # Queued (even if backing off) or abandoned: take it over
+                    job_id = row["id"]
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                        (RUNNING, now + self.lease_seconds, now, job_id)
+                    )
+                job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._public(job), True
+
+    def _release(self, job_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), run_after = ?, lease_until = NULL, updated_at = ? "
+                "WHERE id = ? AND status = ?",
+                (QUEUED, now, now, job_id, RUNNING)
+            )
+
+    def _extend_lease(self, job_id: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = ?",
+                (now + self.lease_seconds, now, job_id, RUNNING)
+            )
+
+    def _complete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, lease_until = NULL, last_error = NULL, updated_at = ? WHERE id = ?",
+                (DONE, time.time(), job_id)
+            )
+
+    def _fail(self, job_id: str, error: str) -> str:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if row is None:
+                return FAILED
+
+            if row["attempts"] >= row["max_attempts"]:
+                status, run_after = FAILED, now
+            else:
+                # Exponential backoff between attempts, capped at 5 minutes
+                status, run_after = QUEUED, now + min(2 ** row["attempts"], 300)
+
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, run_after = ?, lease_until = NULL, last_error = ?, updated_at = ? WHERE id = ?",
+                (status, run_after, error[:1000], now, job_id)
+            )
+        return status
+
+    def _get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._public(row) if row else None
+
+    def _for_entry(self, entry_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE entry_id = ? ORDER BY created_at", (entry_id,)
+            ).fetchall()
+        return [self._public(row) for row in rows]
+
+    def _depth(self, kinds: List[str]) -> int:
+        placeholders = ",".join("?" for _ in kinds)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE kind IN ({placeholders}) AND status IN (?, ?)",
+                (*kinds, QUEUED, RUNNING)
+            ).fetchone()
+        return row[0]
+
+    def _purge(self, older_than_seconds: float) -> int:
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (DONE, FAILED, cutoff)
+            )
+        return cursor.rowcount
+
+    @staticmethod
+    def _public(row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    # -- async API --
+
+    async def enqueue(
+        self,
+        kind: str,
+        payload: Dict,
+        entry_id: Optional[str] = None,
+        max_attempts: int = 5,
+        dedupe_key: Optional[str] = None
+    ) -> str:
+        """Persist a job and wake up idle workers
+
+        Jobs sharing a `dedupe_key` are single-flight: while one is queued or
+        running, enqueueing another returns the existing job id.
+        """
+        job_id = await asyncio.to_thread(self._enqueue, kind, payload, entry_id, max_attempts, dedupe_key)
+        self._notify.set()
+        return job_id
+
+    async def acquire(
+        self,
+        kind: str,
+        payload: Dict,
+        dedupe_key: str,
+        entry_id: Optional[str] = None,
+        max_attempts: int = 5
+    ) -> Tuple[Dict, bool]:
+        """Run the job for `dedupe_key` in the caller, outside the worker pool
+
+        Creates it as running, or takes over a queued or abandoned one, and
+        returns (job, True); the caller must then keep its lease alive and
+        complete, fail or release it. If someone else holds a live lease,
+        returns (their job, False).
+        """
+        return await asyncio.to_thread(self._acquire, kind, payload, dedupe_key, entry_id, max_attempts)
+
+    async def release(self, job_id: str) -> None:
+        """Hand an acquired job back to the workers without counting the attempt"""
+        await asyncio.to_thread(self._release, job_id)
+        self._notify.set()
+
+    async def heartbeat(self, job_id: str) -> None:
+        """Keep a running job's lease alive until cancelled"""
+        interval = max(self.lease_seconds / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            await self.extend_lease(job_id)
+
+    async def claim(self, kinds: List[str]) -> Optional[Dict]:
+        """Claim the next due job of the given kinds, if any"""
+        return await asyncio.to_thread(self._claim, kinds)
+
+    async def extend_lease(self, job_id: str) -> None:
+        await asyncio.to_thread(self._extend_lease, job_id)
+
+    async def complete(self, job_id: str) -> None:
+        await asyncio.to_thread(self._complete, job_id)
+
+    async def fail(self, job_id: str, error: str) -> str:
+        """Record a failed attempt; returns the new job status"""
+        return await asyncio.to_thread(self._fail, job_id, error)
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def jobs_for_entry(self, entry_id: str) -> List[Dict]:
+        return await asyncio.to_thread(self._for_entry, entry_id)
+
+    async def depth(self, kinds: List[str]) -> int:
+        """Jobs of the given kinds that are queued or running"""
+        return await asyncio.to_thread(self._depth, kinds)
+
+    async def purge(self, older_than_seconds: float = 7 * 24 * 3600) -> int:
+        """Drop finished jobs older than the given age"""
+        return await asyncio.to_thread(self._purge, older_than_seconds)
+
+    async def wait_for_work(self, timeout: float) -> None:
+        """Sleep until a job is enqueued in this process or the timeout passes"""
+        try:
+            await asyncio.wait_for(self._notify.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._notify.clear()
+
+
+JobHandler = Callable[[Dict], Awaitable[Any]]
+FailureHandler = Callable[[Dict, str], Awaitable[Any]]
+
+
+class JobWorkerPool:
+    """Fixed pool of asyncio workers that drain a JobQueue"""
+
+    def __init__(self, queue: JobQueue, concurrency: int = 4, poll_interval: float = 2.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.handlers: Dict[str, JobHandler] = {}
+        self.failure_handlers: Dict[str, FailureHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, kind: str, handler: JobHandler, on_failure: Optional[FailureHandler] = None) -> None:
+        """Register the coroutine that processes jobs of a kind"""
+        self.handlers[kind] = handler
+        if on_failure is not None:
+            self.failure_handlers[kind] = on_failure
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel workers; interrupted jobs are re-delivered after their lease expires"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        kinds = list(self.handlers)
+        while True:
+            try:
+                job = await self.queue.claim(kinds)
+            except Exception as e:
+                print(f"Job queue error: {str(e)}")
+                job = None
+
+            if job is None:
+                await self.queue.wait_for_work(self.poll_interval)
+                continue
+
+            await self._run(job)
+
+    async def _run(self, job: Dict) -> None:
+        heartbeat = asyncio.create_task(self.queue.heartbeat(job["id"]))
+        try:
+            await self.handlers[job["kind"]](job["payload"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            status = await self.queue.fail(job["id"], str(e) or type(e).__name__)
+            if status == FAILED and job["kind"] in self.failure_handlers:
+                try:
+                    await self.failure_handlers[job["kind"]](job["payload"], str(e))
+                except Exception as hook_error:
+                    print(f"Job failure handler error: {str(hook_error)}")
+        else:
+            await self.queue.complete(job["id"])
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,314 @@
+"""
+Storage Lifecycle for DayVibe
+Moves recordings nobody has played for a while to a compact cold tier, and
+brings them back when they're played again
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+# Add shared directory to Python path
+shared_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared')
+if shared_dir not in sys.path:
+    sys.path.append(shared_dir)
+
+from async_database import async_db
+from async_storage import async_storage
+from audio_processor import AudioProcessor, AUDIO_BUCKET, STORAGE_CODECS, ffmpeg_available
+from job_queue import DATA_DIR, JobQueue
+
+# Blobs untouched for this long are compacted into the cold tier
+LIFECYCLE_AGE_DAYS = float(os.getenv("LIFECYCLE_AGE_DAYS", "21"))
+LIFECYCLE_BATCH_SIZE = int(os.getenv("LIFECYCLE_BATCH_SIZE", "20"))
+# Storage traffic budget per run (downloads plus uploads)
+LIFECYCLE_MAX_BYTES_PER_SECOND = float(os.getenv("LIFECYCLE_MAX_MB_PER_SECOND", "5")) * 1024 * 1024
+LIFECYCLE_INTERVAL_HOURS = float(os.getenv("LIFECYCLE_INTERVAL_HOURS", "24"))
+LIFECYCLE_ENABLED = os.getenv("LIFECYCLE_ENABLED", "true").lower() == "true"
+# Playback marks a blob as recently used at most this often, so a track
+# scrubbed with dozens of Range requests costs one write
+ACCESS_RECORD_SECONDS = float(os.getenv("LIFECYCLE_ACCESS_RECORD_MINUTES", "60")) * 60
+ACCESS_RECORD_MAX_BLOBS = 10000
+
+# The cold tier may be a separate (cheaper, private) bucket; by default it's
+# a prefix in the hot one and compaction alone is the saving
+COLD_BUCKET = os.getenv("AUDIO_COLD_BUCKET", AUDIO_BUCKET)
+COLD_PREFIX = "cold/"
+# flac keeps cold recordings lossless; opus is several times smaller but lossy
+COLD_CODEC = os.getenv("LIFECYCLE_COLD_CODEC", "flac").lower()
+
+STATE_PATH = os.getenv("LIFECYCLE_STATE_PATH", os.path.join(DATA_DIR, "lifecycle.json"))
+WORK_DIR = os.path.join(DATA_DIR, "lifecycle")
+
+# Blob tiers; the "to_" states mark a move that has switched the blob row to
+# its new object but not yet finished rewriting entries and deleting the old one
+HOT = "hot"
+COLD = "cold"
+TO_HOT = "to_hot"
+TO_COLD = "to_cold"
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class StorageLifecycle:
+    """Compaction runs and rehydration, executed as background jobs.
+
+    A run walks aged hot blobs in hash order, a batch at a time. The cursor
+    and running totals are saved after every blob, so a run interrupted by a
+    crash or redeploy resumes where it stopped when its job is redelivered.
+    """
+
+    def __init__(self, queue: JobQueue, processor: AudioProcessor, state_path: str = STATE_PATH):
+        if STORAGE_CODECS.get(COLD_CODEC, {}).get("format") is None:
+            raise ValueError(f"LIFECYCLE_COLD_CODEC must be flac or opus, not '{COLD_CODEC}'")
+        self.queue = queue
+        self.processor = processor
+        self.state_path = state_path
+        # Blob hash -> when playback last wrote last_accessed_at, oldest first
+        self._recorded_access: Dict[str, float] = {}
+        os.makedirs(WORK_DIR, exist_ok=True)
+
+    # -- state --
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self, state: Dict) -> None:
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def report(self) -> Dict:
+        """The current run's progress and the last finished run's totals"""
+        return self._load_state()
+
+    # -- scheduling --
+
+    async def schedule(self) -> str:
+        """Queue a run; a run already queued or in progress is reused"""
+        return await self.queue.enqueue("storage_lifecycle", {}, max_attempts=3, dedupe_key="storage_lifecycle")
+
+    async def scheduler(self) -> None:
+        """Queue a run every LIFECYCLE_INTERVAL_HOURS"""
+        while True:
+            try:
+                await self.schedule()
+            except Exception as e:
+                print(f"Could not schedule storage lifecycle: {str(e)}")
+            await asyncio.sleep(LIFECYCLE_INTERVAL_HOURS * 3600)
+
+    async def record_access(self, blob_hash: str) -> None:
+        """Note that a blob was played, so compaction leaves it hot"""
+        now = time.monotonic()
+        last = self._recorded_access.pop(blob_hash, None)
+        if last is not None and now - last < ACCESS_RECORD_SECONDS:
+            self._recorded_access[blob_hash] = last
+            return
+        self._recorded_access[blob_hash] = now
+        if len(self._recorded_access) > ACCESS_RECORD_MAX_BLOBS:
+            del self._recorded_access[next(iter(self._recorded_access))]
+        try:
+            await async_db.touch_blob(blob_hash, datetime.now(timezone.utc).isoformat())
+        except Exception:
+            # Not recorded; the next play tries again
+            self._recorded_access.pop(blob_hash, None)
+            raise
+
+    async def request_rehydrate(self, blob_hash: str) -> Optional[str]:
+        """Bring a cold blob back to the hot tier after it was played"""
+        if COLD_BUCKET == AUDIO_BUCKET:
+            # Same bucket: the compact copy is as fast to serve as the original
+            return None
+        return await self.queue.enqueue(
+            "storage_rehydrate",
+            {"blob_hash": blob_hash},
+            dedupe_key=f"rehydrate:{blob_hash}"
+        )
+
+    # -- jobs --
+
+    async def run_job(self, payload: Dict) -> None:
+        state = self._load_state()
+        current = state.get("current")
+        if current is None:
+            now = datetime.now(timezone.utc)
+            current = {
+                "run_id": uuid.uuid4().hex,
+                "started_at": now.isoformat(),
+                "cutoff": (now - timedelta(days=LIFECYCLE_AGE_DAYS)).isoformat(),
+                "cursor": "",
+                "blobs_compacted": 0,
+                "blobs_resumed": 0,
+                "failures": 0,
+                "bytes_before": 0,
+                "bytes_after": 0
+            }
+            state["current"] = current
+            self._save_state(state)
+
+        # Moves interrupted by a crash are finished first
+        for blob in await async_db.select("audio_blobs", conditions={"tier": f"in.({TO_HOT},{TO_COLD})"}):
+            await self._finish_move(blob)
+            current["blobs_resumed"] += 1
+            self._save_state(state)
+
+        # Compaction re-encodes with ffmpeg; without it every blob would be
+        # downloaded only to fail
+        current["skipped"] = None if ffmpeg_available() else "ffmpeg not installed"
+        started = time.monotonic()
+        moved_bytes = 0
+        while current["skipped"] is None:
+            cutoff = current["cutoff"]
+            batch = await async_db.select(
+                "audio_blobs",
+                {"tier": HOT},
+                order="hash.asc",
+                limit=LIFECYCLE_BATCH_SIZE,
+                conditions={
+                    "hash": f"gt.{current['cursor']}",
+                    "created_at": f"lt.{cutoff}",
+                    "or": f"(last_accessed_at.is.null,last_accessed_at.lt.{cutoff})"
+                }
+            )
+            if not batch:
+                break
+
+            for blob in batch:
+                try:
+                    result = await self._compact(blob)
+                except Exception as e:
+                    # Skipped for this run; the next run tries it again
+                    print(f"Lifecycle failed for blob {blob['hash']}: {str(e)}")
+                    current["failures"] += 1
+                else:
+                    current["blobs_compacted"] += 1
+                    current["bytes_before"] += result["bytes_before"]
+                    current["bytes_after"] += result["bytes_after"]
+                    moved_bytes += result["bytes_before"] + result["bytes_after"]
+
+                current["cursor"] = blob["hash"]
+                self._save_state(state)
+
+                # Stay within the storage traffic budget
+                ahead = moved_bytes / LIFECYCLE_MAX_BYTES_PER_SECOND - (time.monotonic() - started)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+
+        current["finished_at"] = datetime.now(timezone.utc).isoformat()
+        current["bytes_reclaimed"] = current["bytes_before"] - current["bytes_after"]
+        print(
+            f"Storage lifecycle run {current['run_id']}: {current['blobs_compacted']} blobs compacted, "
+            f"{current['bytes_reclaimed']} bytes reclaimed, {current['failures']} failures"
+            + (f" (compaction skipped: {current['skipped']})" if current["skipped"] else "")
+        )
+        self._save_state({"last_run": current})
+
+    async def rehydrate_job(self, payload: Dict) -> None:
+        blob = await async_db.get_blob(payload["blob_hash"])
+        if blob is None:
+            return
+        if blob["tier"] in (TO_HOT, TO_COLD):
+            await self._finish_move(blob)
+            return
+        if blob["tier"] != COLD:
+            return
+
+        # Already compact, so it goes back as-is
+        extension = os.path.splitext(blob["storage_path"])[1]
+        local_path = os.path.join(WORK_DIR, f"{blob['hash']}{extension}")
+        try:
+            await async_storage.download(blob["storage_bucket"], blob["storage_path"], local_path)
+            hot_path = f"blobs/{blob['hash']}{extension}"
+            await self.processor.save_to_storage(local_path, hot_path, blob["content_type"], AUDIO_BUCKET)
+            await self._switch(blob, COLD, TO_HOT, AUDIO_BUCKET, hot_path, blob["content_type"], blob["size_bytes"])
+        finally:
+            _remove(local_path)
+
+    # -- moves --
+
+    async def _compact(self, blob: Dict) -> Dict:
+        """Re-encode one hot blob into the cold tier"""
+        local_path = os.path.join(WORK_DIR, blob["hash"])
+        encoded = None
+        try:
+            bytes_before = await async_storage.download(
+                blob.get("storage_bucket") or AUDIO_BUCKET, blob["storage_path"], local_path
+            )
+            codec = STORAGE_CODECS[COLD_CODEC]
+            if blob.get("content_type") == codec["content_type"]:
+                # Already in the cold codec; only the location changes
+                source_path, content_type = local_path, codec["content_type"]
+            else:
+                encoded = await self.processor.transcode_for_storage(local_path, COLD_CODEC)
+                if encoded is None:
+                    raise Exception(f"could not encode to {COLD_CODEC}")
+                source_path, content_type = encoded["path"], encoded["content_type"]
+
+            bytes_after = os.path.getsize(source_path)
+            if bytes_after >= bytes_before and source_path != local_path:
+                raise Exception("encoded copy is not smaller than the original")
+
+            cold_path = f"{COLD_PREFIX}{blob['hash']}.{codec['extension']}"
+            await self.processor.save_to_storage(source_path, cold_path, content_type, COLD_BUCKET)
+            await self._switch(blob, HOT, TO_COLD, COLD_BUCKET, cold_path, content_type, bytes_after)
+        finally:
+            _remove(local_path)
+            if encoded is not None:
+                _remove(encoded["path"])
+
+        return {"bytes_before": bytes_before, "bytes_after": bytes_after}
+
+    async def _switch(self, blob: Dict, from_tier: str, via_tier: str, bucket: str, path: str, content_type: str, size: int) -> None:
+        """Point the blob row at its new object, then finish the move.
+
+        New uploads that acquire the blob from here on get the new object;
+        the old one is deleted only after every entry has been rewritten.
+        """
+        updated = await async_db.update_blob(blob["hash"], from_tier, {
+            "tier": via_tier,
+            "storage_bucket": bucket,
+            "storage_path": path,
+            "content_type": content_type,
+            "size_bytes": size,
+            "previous_storage_bucket": blob.get("storage_bucket") or AUDIO_BUCKET,
+            "previous_storage_path": blob["storage_path"],
+            "last_accessed_at": datetime.now(timezone.utc).isoformat() if via_tier == TO_HOT else blob.get("last_accessed_at")
+        })
+        if not updated:
+            # Someone else moved it meanwhile; drop our copy
+            await self.processor.remove_from_storage(path, bucket)
+            raise Exception(f"blob {blob['hash']} changed during the move")
+        await self._finish_move(updated[0])
+
+    async def _finish_move(self, blob: Dict) -> None:
+        """Rewrite entries, settle the tier and delete the old object; idempotent"""
+        audio_url = self.processor.object_url(blob["storage_path"], blob["storage_bucket"])
+        await async_db.point_entries_at_blob(blob["hash"], audio_url)
+
+        final_tier = HOT if blob["tier"] == TO_HOT else COLD
+        await async_db.update_blob(blob["hash"], blob["tier"], {
+            "tier": final_tier,
+            "previous_storage_bucket": None,
+            "previous_storage_path": None
+        })
+
+        previous = (blob.get("previous_storage_bucket"), blob.get("previous_storage_path"))
+        if previous[1] and previous != (blob["storage_bucket"], blob["storage_path"]):
+            await self.processor.remove_from_storage(previous[1], previous[0])
+            # An upload that acquired the blob before the switch may have
+            # inserted its entry with the old URL since the first rewrite
+            await async_db.point_entries_at_blob(blob["hash"], audio_url)
@@ -2,13 +2,19 @@
 FastAPI Backend for DayVibe
 Handles audio processing, AI analysis, and API endpoints
 """
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.security import HTTPBearer
 import os
 import sys
-from datetime import datetime
-from typing import Optional, List
+import asyncio
+import time
+import uuid
+import hashlib
+from datetime import datetime, timezone as tz
+from typing import Optional
 import json
 
 # Add shared directory to Python path
@@ -17,8 +23,20 @@ if shared_dir not in sys.path:
     sys.path.append(shared_dir)
 
 from supabase_config import supabase_config
-from openai_service import OpenAIService
-from audio_processor import AudioProcessor
+from async_database import async_db
+from async_storage import async_storage, StorageError
+from openai_service import OpenAIService, ANALYSIS_PROMPT_VERSION
+from audio_processor import AudioProcessor, AUDIO_BUCKET
+from auth import current_user_id, require_admin, supabase_auth
+from lifecycle import StorageLifecycle, COLD, LIFECYCLE_ENABLED
+from audio_workers import AudioWorkerPool, hash_file, waveform_file
+from pipeline import StageGraph, StageError
+from job_queue import JobQueue, JobWorkerPool, DATA_DIR, FAILED
+from transcription_cache import TranscriptionCache
+from user_stats import record_entry, record_sentiment, rebuild_user_stats
+from streaks import current_streak, local_today
+from audio_probe import InvalidAudioFile, probe_audio, sniff_container
+from ingest import UploadSizeLimitMiddleware, UploadTooLarge, spool_upload, MAX_UPLOAD_MB
 
 app = FastAPI(title="DayVibe API", version="1.0.0")
 
@@ -31,6 +49,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Refuse oversized uploads before their body is buffered
+app.add_middleware(UploadSizeLimitMiddleware, paths=["/api/voice/upload"], max_size_mb=MAX_UPLOAD_MB)
+
 # Security
 security = HTTPBearer()
 
@@ -38,133 +59,730 @@ security = HTTPBearer()
 openai_service = OpenAIService()
 audio_processor = AudioProcessor()
 
+# Per-stage timeouts for the upload pipeline (seconds)
+STORAGE_TIMEOUT = float(os.getenv("STORAGE_TIMEOUT_SECONDS", "30"))
+TRANSCRIPTION_TIMEOUT = float(os.getenv("TRANSCRIPTION_TIMEOUT_SECONDS", "120"))
+DATABASE_TIMEOUT = float(os.getenv("DATABASE_TIMEOUT_SECONDS", "10"))
+
+# Playback is relayed from storage in fixed-size chunks
+AUDIO_STREAM_CHUNK_SIZE = int(os.getenv("AUDIO_STREAM_CHUNK_KB", "64")) * 1024
+# Response headers relayed from storage on playback
+PLAYBACK_HEADERS = ("content-type", "content-length", "content-range", "etag", "last-modified")
+
+# How often a stream waiting on someone else's analysis checks for the result
+ANALYSIS_STREAM_POLL_SECONDS = 1.0
+
+# Background jobs: transcription and analysis run outside the request
+SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(DATA_DIR, "spool"))
+os.makedirs(SPOOL_DIR, exist_ok=True)
+job_queue = JobQueue(lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "300")))
+job_workers = JobWorkerPool(job_queue, concurrency=int(os.getenv("JOB_WORKERS", "4")))
+transcription_cache = TranscriptionCache()
+
+# Decode/resample/VAD/encode run in worker processes, off the event loop
+audio_workers = AudioWorkerPool()
+
+# Aged recordings are compacted into a cold tier by a background job
+storage_lifecycle = StorageLifecycle(job_queue, audio_processor)
+lifecycle_scheduler: Optional[asyncio.Task] = None
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "DayVibe API is running", "version": "1.0.0"}
 
-@app.post("/api/voice/upload")
+@app.on_event("startup")
+async def start_job_workers():
+    """Start background workers; jobs left over from a crash are re-claimed"""
+    if supabase_config.service_key is None:
+        print("SUPABASE_SERVICE_ROLE_KEY is not set: backend requests use the anon key and are subject to RLS")
+    await job_queue.purge()
+    audio_workers.start()
+    job_workers.start()
+    if LIFECYCLE_ENABLED:
+        global lifecycle_scheduler
+        lifecycle_scheduler = asyncio.create_task(storage_lifecycle.scheduler())
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    if lifecycle_scheduler is not None:
+        lifecycle_scheduler.cancel()
+    await job_workers.stop()
+    audio_workers.shutdown()
+    await openai_service.close()
+    await async_db.close()
+    await async_storage.close()
+    await supabase_auth.close()
+
+async def owned_entry(entry_id: str, user_id: str, columns: str = "*") -> dict:
+    """The entry if `user_id` owns it; someone else's looks the same as a missing one"""
+    columns = columns if columns == "*" else f"user_id,{columns}"
+    entry = await async_db.get_entry(entry_id, columns=columns)
+    if entry is None or str(entry.get("user_id")) != user_id:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    return entry
+
+@app.post("/api/voice/upload", status_code=202)
 async def upload_voice_recording(
     file: UploadFile = File(...),
-    user_id: Optional[str] = None
+    timezone: Optional[str] = None,
+    user_id: str = Depends(current_user_id)
 ):
-    """Upload and process voice recording"""
+    """Upload a voice recording and queue it for transcription and analysis"""
     try:
         # Validate file type
         if not file.content_type.startswith('audio/'):
             raise HTTPException(status_code=400, detail="Invalid file type")
         
-        # Process audio file
-        audio_data = await file.read()
-        processed_audio = audio_processor.process_audio(audio_data)
-        
-        # Save to Supabase Storage
-        file_path = f"recordings/{user_id}/{datetime.now().isoformat()}.wav"
-        storage_url = await audio_processor.save_to_storage(processed_audio, file_path)
-        
-        # Transcribe with OpenAI Whisper
-        transcription = await openai_service.transcribe_audio(processed_audio)
-        
-        # Save to database
-        client = supabase_config.get_client()
-        entry_data = {
-            "user_id": user_id,
-            "audio_url": storage_url,
-            "transcription": transcription,
-            "created_at": datetime.now().isoformat(),
-            "status": "processed"
+        # Magic bytes first: non-audio payloads are refused before spooling
+        head = await file.read(16)
+        await file.seek(0)
+        if sniff_container(head) is None:
+            raise HTTPException(status_code=400, detail="Unrecognized audio format")
+        
+        # Stream the upload to the spool file the transcription job will read;
+        # the size limit is enforced while chunks arrive
+        spool_path = os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}.wav")
+        try:
+            spooled = await spool_upload(file, spool_path)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        
+        # From here on the spool file is ours to delete until the
+        # transcription job takes it over
+        try:
+            # Header-only parse for sample rate, channels and duration
+            try:
+                metadata = probe_audio(spooled.buffer)
+            except InvalidAudioFile as e:
+                raise HTTPException(status_code=400, detail=f"Invalid audio file: {str(e)}")
+            duration = metadata["duration_seconds"]
+            
+            # Retries and duplicate submissions hit the transcript cache and skip
+            # Whisper; recordings are stored content-addressed by the same hash
+            spooled.close()
+            blob_hash = await asyncio.to_thread(hash_file, spool_path)
+            # A miss is counted by the transcription job, when Whisper runs
+            cached_transcription = await transcription_cache.get(blob_hash, count_miss=False)
+            status = "analyzing" if cached_transcription else "pending"
+            
+            upload_extension = os.path.splitext(file.filename or "")[1].lstrip(".") or "wav"
+            
+            # Set once this upload holds a reference to the blob
+            held = {}
+            
+            async def store_recording():
+                # Audio already in storage only gains a reference: no transcode, no PUT
+                blob = await async_db.acquire_blob(blob_hash)
+                if blob is None:
+                    stored = await audio_processor.archive_recording(
+                        spooled.path, f"blobs/{blob_hash}", file.content_type, upload_extension
+                    )
+                    blob = await async_db.register_blob(
+                        blob_hash, stored["path"], stored["content_type"], stored["size"]
+                    )
+                held["blob"] = blob["hash"]
+                return blob
+            
+            async def store_waveform():
+                # A preview is optional; never fail the upload over it
+                try:
+                    peaks = await audio_workers.run(waveform_file, spooled.path)
+                    return await audio_processor.save_waveform(peaks) if peaks else None
+                except Exception as e:
+                    print(f"Waveform failed for blob {blob_hash}: {str(e)}")
+                    return None
+            
+            async def insert_entry(storage, waveform):
+                entry_data = {
+                    "user_id": user_id,
+                    "audio_url": audio_processor.object_url(
+                        storage["storage_path"], storage.get("storage_bucket") or AUDIO_BUCKET
+                    ),
+                    "audio_blob_hash": storage["hash"],
+                    "waveform_path": waveform,
+                    "transcription": cached_transcription,
+                    "duration_seconds": round(duration) if duration is not None else None,
+                    "created_at": datetime.now(tz.utc).isoformat(),
+                    "status": status
+                }
+                entry = await async_db.insert_entry(entry_data)
+                try:
+                    await record_entry(user_id, datetime.now(tz.utc), timezone)
+                except Exception as e:
+                    # The entry is stored; don't fail the upload over its stats
+                    print(f"Stats update failed for user {user_id}: {str(e)}")
+                return entry
+            
+            # The archival copy is transcoded and streamed from disk while the
+            # waveform preview is computed; the entry row needs both
+            graph = StageGraph()
+            graph.add_stage("storage", store_recording, timeout=STORAGE_TIMEOUT)
+            graph.add_stage("waveform", store_waveform, timeout=STORAGE_TIMEOUT)
+            graph.add_stage(
+                "entry",
+                insert_entry,
+                depends_on=["storage", "waveform"],
+                timeout=DATABASE_TIMEOUT
+            )
+            
+            try:
+                results = await graph.run()
+            except BaseException:
+                # No entry was stored, so the reference it would have owned goes
+                if "blob" in held:
+                    try:
+                        await asyncio.shield(release_recording(held["blob"]))
+                    except Exception as e:
+                        print(f"Could not release blob {blob_hash}: {str(e)}")
+                raise
+            
+            entry_id = results["entry"]["id"]
+            
+            if cached_transcription:
+                spooled.discard()
+                job_id = await queue_analysis(entry_id, cached_transcription)
+            else:
+                job_id = await job_queue.enqueue(
+                    "transcribe",
+                    {
+                        "entry_id": entry_id,
+                        "spool_path": spool_path,
+                        "audio_hash": blob_hash,
+                        "filename": file.filename or "audio.wav",
+                        "content_type": file.content_type
+                    },
+                    entry_id=str(entry_id)
+                )
+            
+        except BaseException:
+            spooled.discard()
+            raise
+        
+        return {
+            "success": True,
+            "entry_id": entry_id,
+            "job_id": job_id,
+            "status": status,
+            "transcription": cached_transcription,
+            # The bucket is private; recordings are played through the API
+            "audio_url": f"/api/entries/{entry_id}/audio",
+            "audio": metadata
         }
         
-        result = client.table("journal_entries").insert(entry_data).execute()
+    except HTTPException:
+        raise
+    except StageError as e:
+        raise HTTPException(status_code=504 if e.timed_out else 500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/analysis/generate", status_code=202)
+async def generate_ai_analysis(entry_id: str, response: Response, user_id: str = Depends(current_user_id)):
+    """Return the stored analysis for an entry, or queue one if it doesn't exist"""
+    try:
+        entry = await owned_entry(entry_id, user_id)
+        
+        transcription = entry.get("transcription")
+        if not transcription:
+            raise HTTPException(status_code=409, detail="Entry has not been transcribed yet")
+        
+        # Idempotent: an analysis of this exact transcript and prompt is reused
+        existing = await async_db.get_analysis(entry_id, transcription_hash(transcription), ANALYSIS_PROMPT_VERSION)
+        if existing is not None:
+            response.status_code = 200
+            return {
+                "success": True,
+                "entry_id": entry_id,
+                "status": "processed",
+                "analysis": existing,
+                "analysis_id": existing["id"]
+            }
+        
+        # Single-flight: concurrent requests share one queued job. The status
+        # goes first so a fast worker's "processed" is never overwritten
+        await async_db.update_entry(entry_id, {"status": "analyzing"})
+        job_id = await queue_analysis(entry_id, transcription)
         
         return {
             "success": True,
-            "entry_id": result.data[0]["id"],
-            "transcription": transcription,
-            "audio_url": storage_url
+            "entry_id": entry_id,
+            "job_id": job_id,
+            "status": "analyzing"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/api/analysis/generate")
-async def generate_ai_analysis(entry_id: str):
-    """Generate AI analysis for a journal entry"""
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/api/analysis/stream")
+async def stream_ai_analysis(entry_id: str, user_id: str = Depends(current_user_id)):
+    """Generate an entry's analysis, streamed as Server-Sent Events
+    
+    Events: `token` for each piece of the completion, `field` as each of
+    themes/sentiment/insights/goals is complete, then `result` with the
+    stored analysis. If a worker or another stream is already generating
+    it, a `status` event is sent and `result` follows once that finishes.
+    On failure an `error` event is sent and the job is retried in the
+    background, as /api/analysis/generate would.
+    """
     try:
-        client = supabase_config.get_client()
+        # Checked before anything is read or a job is started for the entry
+        entry = await owned_entry(entry_id, user_id)
         
-        # Get entry
-        entry = client.table("journal_entries").select("*").eq("id", entry_id).execute()
-        if not entry.data:
-            raise HTTPException(status_code=404, detail="Entry not found")
+        transcription = entry.get("transcription")
+        if not transcription:
+            raise HTTPException(status_code=409, detail="Entry has not been transcribed yet")
         
-        transcription = entry.data[0]["transcription"]
+        text_hash = transcription_hash(transcription)
+        existing = await async_db.get_analysis(entry_id, text_hash, ANALYSIS_PROMPT_VERSION)
         
-        # Generate analysis with OpenAI
-        analysis = await openai_service.analyze_journal_entry(transcription)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    async def events():
+        if existing is not None:
+            yield sse_event("result", {"entry_id": entry_id, "status": "processed", "analysis": existing, "analysis_id": existing["id"]})
+            return
         
-        # Save analysis
-        analysis_data = {
+        # Single-flight with /api/analysis/generate and other streams: only
+        # the holder of the analyze job calls the model, everyone else waits
+        # for the row it stores
+        dedupe_key = analysis_dedupe_key(entry_id, transcription)
+        waiting = False
+        while True:
+            job, owner = await job_queue.acquire("analyze", {"entry_id": entry_id}, dedupe_key, entry_id=str(entry_id))
+            if owner:
+                break
+            if not waiting:
+                waiting = True
+                yield sse_event("status", {"entry_id": entry_id, "status": "analyzing", "job_id": job["id"]})
+            await asyncio.sleep(ANALYSIS_STREAM_POLL_SECONDS)
+            stored = await async_db.get_analysis(entry_id, text_hash, ANALYSIS_PROMPT_VERSION)
+            if stored is not None:
+                yield sse_event("result", {"entry_id": entry_id, "status": "processed", "analysis": stored, "analysis_id": stored["id"]})
+                return
+            current = await job_queue.get(job["id"])
+            if current is not None and current["status"] == FAILED:
+                yield sse_event("error", {"entry_id": entry_id, "detail": current["last_error"]})
+                return
+            # Keeps proxies from closing an idle stream
+            yield ": waiting\n\n"
+        
+        heartbeat = asyncio.create_task(job_queue.heartbeat(job["id"]))
+        settled = False
+        try:
+            # The previous holder may have stored it just before we took over
+            stored = await async_db.get_analysis(entry_id, text_hash, ANALYSIS_PROMPT_VERSION)
+            if stored is None:
+                await async_db.update_entry(entry_id, {"status": "analyzing"})
+                # The job we hold counts itself, as in analysis_job
+                route = openai_service.route_analysis(transcription, await job_queue.depth(["analyze"]))
+                started = time.monotonic()
+                analysis = None
+                async for kind, value in openai_service.stream_analysis(transcription, route["model"]):
+                    if kind == "token":
+                        yield sse_event("token", {"text": value})
+                    elif kind == "field":
+                        yield sse_event("field", {"name": value[0], "value": value[1]})
+                    else:
+                        analysis = value
+                latency_ms = int((time.monotonic() - started) * 1000)
+                
+                stored = await store_analysis(entry, text_hash, analysis, route, latency_ms)
+                if stored is None:
+                    stored = await async_db.get_analysis(entry_id, text_hash, ANALYSIS_PROMPT_VERSION)
+            await async_db.update_entry(entry_id, {"status": "processed"})
+            await job_queue.complete(job["id"])
+            settled = True
+            yield sse_event("result", {"entry_id": entry_id, "status": "processed", "analysis": stored, "analysis_id": stored["id"]})
+            
+        except Exception as e:
+            # Counts as a failed attempt: the workers retry it with backoff
+            status = await job_queue.fail(job["id"], str(e) or type(e).__name__)
+            settled = True
+            if status == FAILED:
+                await mark_entry_failed({"entry_id": entry_id}, str(e))
+            yield sse_event("error", {"entry_id": entry_id, "detail": str(e)})
+        finally:
+            heartbeat.cancel()
+            if not settled:
+                # The client went away: hand the job to the workers. Shielded
+                # so a cancelled stream still releases it
+                try:
+                    await asyncio.shield(job_queue.release(job["id"]))
+                except asyncio.CancelledError:
+                    pass
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/entries/{entry_id}/status")
+async def get_entry_status(entry_id: str, user_id: str = Depends(current_user_id)):
+    """Poll processing status of one of the caller's journal entries"""
+    try:
+        entry = await owned_entry(entry_id, user_id)
+        
+        jobs = await job_queue.jobs_for_entry(str(entry_id))
+        
+        response = {
             "entry_id": entry_id,
-            "themes": analysis["themes"],
-            "sentiment": analysis["sentiment"],
-            "insights": analysis["insights"],
-            "suggested_goals": analysis["goals"],
-            "created_at": datetime.now().isoformat()
+            "status": entry.get("status"),
+            "transcription": entry.get("transcription"),
+            "jobs": [
+                {
+                    "job_id": job["id"],
+                    "kind": job["kind"],
+                    "status": job["status"],
+                    "attempts": job["attempts"],
+                    "error": job["last_error"]
+                }
+                for job in jobs
+            ]
         }
         
-        result = client.table("ai_analysis").insert(analysis_data).execute()
+        if entry.get("status") == "processed":
+            response["analysis"] = await async_db.get_analysis(entry_id)
         
-        return {
-            "success": True,
-            "analysis": analysis,
-            "analysis_id": result.data[0]["id"]
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/entries/{entry_id}/waveform")
+async def get_entry_waveform(entry_id: str, request: Request, user_id: str = Depends(current_user_id)):
+    """Binary min/max peaks for drawing an entry's waveform, for its owner"""
+    try:
+        entry = await owned_entry(entry_id, user_id, columns="waveform_path")
+        if not entry.get("waveform_path"):
+            raise HTTPException(status_code=404, detail="Waveform not found")
+        
+        # Content-addressed, so the path's hash is a stable ETag and the
+        # response can be cached for good, but only by the owner's browser
+        path = entry["waveform_path"]
+        headers = {
+            "ETag": f'"{os.path.splitext(os.path.basename(path))[0]}"',
+            "Cache-Control": "private, max-age=31536000, immutable"
         }
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+        
+        peaks = await audio_processor.load_waveform(path)
+        return Response(content=peaks, media_type="application/octet-stream", headers=headers)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/user/{user_id}/stats")
-async def get_user_stats(user_id: str):
-    """Get user statistics"""
+@app.get("/api/entries/{entry_id}/audio")
+async def stream_entry_audio(entry_id: str, request: Request, user_id: str = Depends(current_user_id)):
+    """Stream an entry's recording to its owner, with Range and ETag support"""
     try:
-        client = supabase_config.get_client()
+        # The blob row is embedded through the entry's foreign key: it always
+        # names the current object, even while a tier move is rewriting audio_url
+        entry = await owned_entry(
+            entry_id, user_id, columns="audio_url,audio_blob_hash,audio_blobs(storage_bucket,storage_path,tier)"
+        )
+        
+        blob = entry.get("audio_blobs")
+        if blob:
+            location = (blob.get("storage_bucket") or AUDIO_BUCKET, blob["storage_path"])
+        else:
+            location = async_storage.object_location(entry.get("audio_url"))
+        if location is None:
+            raise HTTPException(status_code=404, detail="Recording not found")
+        bucket, path = location
         
-        # Get entry count
-        entries = client.table("journal_entries").select("id", count="exact").eq("user_id", user_id).execute()
-        entry_count = entries.count
+        if blob:
+            try:
+                await storage_lifecycle.record_access(entry["audio_blob_hash"])
+                # Played again: move it back to the hot tier in the background
+                if blob.get("tier") == COLD:
+                    await storage_lifecycle.request_rehydrate(entry["audio_blob_hash"])
+            except Exception as e:
+                print(f"Could not record playback for entry {entry_id}: {str(e)}")
         
-        # Get streak (simplified - you'd want more complex logic)
-        recent_entries = client.table("journal_entries").select("created_at").eq("user_id", user_id).order("created_at", desc=True).limit(30).execute()
+        # Range and If-None-Match go to storage, which answers 206/304/416
+        # itself; only the requested bytes are relayed, chunk by chunk
+        upstream = await async_storage.open_object(bucket, path, dict(request.headers))
+        headers = {
+            name: upstream.headers[name] for name in PLAYBACK_HEADERS if name in upstream.headers
+        }
+        headers["Accept-Ranges"] = "bytes"
+        headers["Cache-Control"] = "private, max-age=3600"
         
-        # Calculate streak
-        streak = calculate_streak(recent_entries.data)
+        if upstream.status_code in (304, 416):
+            await upstream.aclose()
+            headers.pop("content-length", None)
+            return Response(status_code=upstream.status_code, headers=headers)
         
-        # Get average sentiment
-        analysis = client.table("ai_analysis").select("sentiment").execute()
-        avg_sentiment = calculate_average_sentiment(analysis.data)
+        return StreamingResponse(
+            upstream.aiter_bytes(AUDIO_STREAM_CHUNK_SIZE),
+            status_code=upstream.status_code,
+            headers=headers,
+            background=BackgroundTask(upstream.aclose)
+        )
+        
+    except HTTPException:
+        raise
+    except StorageError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/entries/{entry_id}")
+async def delete_entry(entry_id: str, user_id: str = Depends(current_user_id)):
+    """Delete one of the caller's entries with its analyses, and its recording
+    once no other entry shares it"""
+    try:
+        entry = await owned_entry(entry_id, user_id, columns="audio_blob_hash,waveform_path")
+        
+        await async_db.delete_entry(entry_id)
+        if entry.get("audio_blob_hash"):
+            await release_recording(entry["audio_blob_hash"])
+        if entry.get("waveform_path"):
+            await release_waveform(entry["waveform_path"])
+        
+        # Counts, streaks and mood, without the deleted entry's sentiment
+        try:
+            await rebuild_user_stats(user_id)
+        except Exception as e:
+            print(f"Stats rebuild failed for user {user_id}: {str(e)}")
+        
+        return {"success": True, "entry_id": entry_id}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Operational counters for caches and queues"""
+    return {
+        "transcription_cache": await transcription_cache.stats(),
+        "storage_transcoding": audio_processor.get_transcode_stats(),
+        "audio_workers": audio_workers.stats(),
+        "storage_lifecycle": storage_lifecycle.report(),
+        "openai": openai_service.stats()
+    }
+
+@app.post("/api/storage/lifecycle/run", status_code=202, dependencies=[Depends(require_admin)])
+async def run_storage_lifecycle():
+    """Start a compaction run now instead of waiting for the schedule (operators only)"""
+    try:
+        job_id = await storage_lifecycle.schedule()
+        return {"success": True, "job_id": job_id}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def require_self(user_id: str, caller_id: str) -> None:
+    """Stats are only served to the user they belong to"""
+    if user_id != caller_id:
+        raise HTTPException(status_code=403, detail="Not allowed")
+
+@app.get("/api/user/{user_id}/stats")
+async def get_user_stats(user_id: str, caller_id: str = Depends(current_user_id)):
+    """Get user statistics"""
+    require_self(user_id, caller_id)
+    try:
+        # Maintained incrementally on every write, so this is one row lookup
+        stats = await async_db.get_user_stats(user_id) or {}
         
         return {
-            "total_entries": entry_count,
-            "current_streak": streak,
-            "average_mood": avg_sentiment
+            "total_entries": stats.get("total_entries") or 0,
+            "current_streak": current_streak(stats, local_today(stats.get("timezone"))),
+            "longest_streak": stats.get("longest_streak") or 0,
+            "average_mood": round(float(stats.get("avg_mood") or 0.0), 1),
+            "last_entry_date": stats.get("last_entry_date")
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-def calculate_streak(entries):
-    """Calculate current streak"""
-    # Simplified streak calculation
-    return len(entries)
+@app.post("/api/user/{user_id}/stats/rebuild")
+async def rebuild_stats(user_id: str, timezone: Optional[str] = None, caller_id: str = Depends(current_user_id)):
+    """Backfill stats and streaks from the user's full entry history"""
+    require_self(user_id, caller_id)
+    try:
+        stats = await rebuild_user_stats(user_id, timezone)
+        return {
+            "success": True,
+            "total_entries": stats.get("total_entries") or 0,
+            "current_streak": current_streak(stats, local_today(stats.get("timezone"))),
+            "longest_streak": stats.get("longest_streak") or 0
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Background job handlers
+
+async def release_recording(blob_hash: str):
+    """Drop one reference to a blob; the last one removes the stored object"""
+    released = await async_db.release_blob(blob_hash)
+    if released is None or released["ref_count"] > 0:
+        return
+    bucket = released.get("storage_bucket") or AUDIO_BUCKET
+    await audio_processor.remove_from_storage(released["storage_path"], bucket)
+    if released.get("previous_storage_path"):
+        # Deleted mid-move: the object it was moving from goes too
+        await audio_processor.remove_from_storage(
+            released["previous_storage_path"], released.get("previous_storage_bucket") or AUDIO_BUCKET
+        )
+
+async def release_waveform(path: str):
+    """Remove a waveform object once no entry uses it; identical recordings
+    share one. Only a preview, so a failure is logged, not raised"""
+    try:
+        if await async_db.count_waveform_refs(path) == 0:
+            await audio_processor.remove_from_storage(path, AUDIO_BUCKET)
+    except Exception as e:
+        print(f"Waveform cleanup failed for {path}: {str(e)}")
+
+def remove_spool_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def transcription_hash(transcription: str) -> str:
+    return hashlib.sha256(transcription.encode("utf-8")).hexdigest()
+
+def analysis_dedupe_key(entry_id, transcription: str) -> str:
+    """One analyze job at a time per (entry, transcript, prompt version)"""
+    return f"analyze:{entry_id}:{transcription_hash(transcription)}:{ANALYSIS_PROMPT_VERSION}"
+
+async def queue_analysis(entry_id, transcription: str) -> str:
+    """Enqueue analysis once per (entry, transcript, prompt version)"""
+    return await job_queue.enqueue(
+        "analyze",
+        {"entry_id": entry_id},
+        entry_id=str(entry_id),
+        dedupe_key=analysis_dedupe_key(entry_id, transcription)
+    )
 
-def calculate_average_sentiment(analysis_data):
-    """Calculate average sentiment score"""
-    if not analysis_data:
-        return 0.0
+async def transcription_job(payload: dict):
+    """pending -> transcribing -> analyzing; idempotent under redelivery"""
+    entry_id = payload["entry_id"]
+    spool_path = payload["spool_path"]
     
-    total = sum(item.get("sentiment", 0) for item in analysis_data)
-    return round(total / len(analysis_data), 1)
+    entry = await async_db.get_entry(entry_id)
+    if entry is None:
+        remove_spool_file(spool_path)
+        return
+    
+    if not entry.get("transcription"):
+        await async_db.update_entry(entry_id, {"status": "transcribing"})
+        updates = {}
+        
+        # Keyed on the upload itself, so a hit skips audio preparation too
+        audio_key = payload.get("audio_hash") or await asyncio.to_thread(hash_file, spool_path)
+        transcription = await transcription_cache.get(audio_key)
+        if transcription is None:
+            # Prepared in a worker process and read back through a memory map
+            prepared_path = f"{spool_path}.prepared"
+            prepared = await audio_workers.prepare(spool_path, prepared_path)
+            with prepared.pop("file"):
+                processed_audio = prepared.pop("audio")
+                chunks = prepared.pop("chunks")
+                if chunks:
+                    # Long recording: chunks are transcribed in parallel
+                    transcribe = openai_service.transcribe_chunks(chunks)
+                elif prepared["content_type"]:
+                    transcribe = openai_service.transcribe_audio(processed_audio)
+                else:
+                    # Passed through untouched; keep the upload's own format
+                    transcribe = openai_service.transcribe_audio(
+                        processed_audio,
+                        filename=payload.get("filename", "audio.wav"),
+                        content_type=payload.get("content_type", "audio/wav")
+                    )
+                transcription = await asyncio.wait_for(transcribe, TRANSCRIPTION_TIMEOUT)
+                del processed_audio, chunks
+            remove_spool_file(prepared_path)
+            await transcription_cache.put(audio_key, transcription)
+            updates = {
+                "silence_removed_seconds": prepared["removed_seconds"],
+                "speech_segments": prepared["segments"]
+            }
+        
+        await async_db.update_entry(entry_id, {"transcription": transcription, **updates})
+        entry["transcription"] = transcription
+    
+    # Before enqueueing, so a fast analysis's "processed" is never overwritten
+    await async_db.update_entry(entry_id, {"status": "analyzing"})
+    await queue_analysis(entry_id, entry["transcription"])
+    remove_spool_file(spool_path)
+
+async def store_analysis(entry: dict, text_hash: str, analysis: dict, route: dict, latency_ms: int):
+    """Persist an analysis once; returns the new row, or None if it already existed"""
+    analysis_data = {
+        "entry_id": entry["id"],
+        "themes": analysis["themes"],
+        "sentiment": analysis["sentiment"],
+        "insights": analysis["insights"],
+        "suggested_goals": analysis["goals"],
+        "transcription_hash": text_hash,
+        "prompt_version": ANALYSIS_PROMPT_VERSION,
+        "model": route["model"],
+        "routing_reason": route["reason"],
+        "latency_ms": latency_ms,
+        "created_at": datetime.now(tz.utc).isoformat()
+    }
+    
+    # The unique key makes a redelivered job's insert a no-op, so the
+    # running mood average is only updated for a newly stored row
+    stored = await async_db.insert_analysis(analysis_data)
+    if stored is not None:
+        # One score per entry: a re-analysis replaces the entry's earlier one
+        await async_db.update_entry(entry["id"], {"mood_score": analysis["sentiment"]})
+        await record_sentiment(entry.get("user_id"), analysis["sentiment"], entry.get("mood_score"))
+    return stored
+
+async def analysis_job(payload: dict):
+    """analyzing -> processed; skips the GPT call if a row already exists"""
+    entry_id = payload["entry_id"]
+    
+    entry = await async_db.get_entry(entry_id)
+    if entry is None:
+        return
+    
+    text_hash = transcription_hash(entry["transcription"])
+    if await async_db.get_analysis(entry_id, text_hash, ANALYSIS_PROMPT_VERSION) is None:
+        # This job counts itself; routing only reacts to a real backlog
+        route = openai_service.route_analysis(entry["transcription"], await job_queue.depth(["analyze"]))
+        started = time.monotonic()
+        analysis = await openai_service.analyze_journal_entry(entry["transcription"], route["model"])
+        latency_ms = int((time.monotonic() - started) * 1000)
+        await store_analysis(entry, text_hash, analysis, route, latency_ms)
+    
+    await async_db.update_entry(entry_id, {"status": "processed"})
+
+async def mark_entry_failed(payload: dict, error: str):
+    """Called once a job has exhausted its retries"""
+    await async_db.update_entry(payload["entry_id"], {"status": "failed"})
+    if "spool_path" in payload:
+        remove_spool_file(payload["spool_path"])
+        remove_spool_file(f"{payload['spool_path']}.prepared")
+
+job_workers.register("transcribe", transcription_job, on_failure=mark_entry_failed)
+job_workers.register("analyze", analysis_job, on_failure=mark_entry_failed)
+job_workers.register("storage_lifecycle", storage_lifecycle.run_job)
+job_workers.register("storage_rehydrate", storage_lifecycle.rehydrate_job)
 
 if __name__ == "__main__":
     import uvicorn
@@ -3,46 +3,335 @@ OpenAI Service for DayVibe
 Handles transcription and AI analysis
 """
 import openai
+import httpx
 import os
-from typing import Dict, List
+import re
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import json
 
+from hedging import Hedger
+from ingest import AudioData, BufferReader
+from partial_json import PartialJSONObject
+from rate_limiter import RateLimiter
+
+# Bump whenever the analysis prompt changes so cached results are redone. The
+# model is routed per request and recorded on each row instead: a stored
+# analysis stays valid whichever model produced it
+ANALYSIS_PROMPT_VERSION = "2"
+
+# Connection pool and per-call timeouts for the shared HTTP client
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "50"))
+OPENAI_MAX_KEEPALIVE = int(os.getenv("OPENAI_MAX_KEEPALIVE", "20"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", "5"))
+TRANSCRIBE_TIMEOUT = float(os.getenv("OPENAI_TRANSCRIBE_TIMEOUT_SECONDS", "120"))
+ANALYSIS_TIMEOUT = float(os.getenv("OPENAI_ANALYSIS_TIMEOUT_SECONDS", "60"))
+
+# Optional Whisper hedging: a backup request once the first is slower than
+# this percentile of recent calls, for at most OPENAI_HEDGE_MAX_RATE extra calls
+HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "false").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "95"))
+HEDGE_MAX_RATE = float(os.getenv("OPENAI_HEDGE_MAX_RATE", "0.05"))
+
+# Account limits per API worker process (divide the account's limits by the
+# number of workers); concurrency starts at the initial value and adapts
+OPENAI_CHAT_RPM = float(os.getenv("OPENAI_CHAT_RPM", "500"))
+OPENAI_CHAT_TPM = float(os.getenv("OPENAI_CHAT_TPM", "40000"))
+OPENAI_WHISPER_RPM = float(os.getenv("OPENAI_WHISPER_RPM", "50"))
+OPENAI_INITIAL_CONCURRENCY = int(os.getenv("OPENAI_INITIAL_CONCURRENCY", "8"))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+
+# Completion tokens reserved per analysis until the real usage is known
+ANALYSIS_COMPLETION_TOKENS = 600
+
+# Analysis model tiers. Entries get the large model unless they're short,
+# the analysis queue is backed up, or its recent latency is over budget
+ANALYSIS_MODEL_LARGE = os.getenv("ANALYSIS_MODEL_LARGE", "gpt-4")
+ANALYSIS_MODEL_SMALL = os.getenv("ANALYSIS_MODEL_SMALL", "gpt-4o-mini")
+ANALYSIS_SHORT_CHARS = int(os.getenv("ANALYSIS_SHORT_CHARS", "400"))
+ANALYSIS_BUSY_QUEUE_DEPTH = int(os.getenv("ANALYSIS_BUSY_QUEUE_DEPTH", "50"))
+ANALYSIS_LATENCY_BUDGET = float(os.getenv("ANALYSIS_LATENCY_BUDGET_SECONDS", "30"))
+# Latency older than this is stale, so an over-budget model gets retried
+MODEL_LATENCY_MAX_AGE = 300
+
+# Transcripts longer than this are analyzed in segments of at most this
+# size, concurrently, and the partial analyses merged locally
+ANALYSIS_SEGMENT_CHARS = int(os.getenv("ANALYSIS_SEGMENT_CHARS", "6000"))
+
+# Parallel Whisper calls per long recording
+CHUNK_CONCURRENCY = int(os.getenv("TRANSCRIPTION_CHUNK_CONCURRENCY", "4"))
+
+# Words compared at each chunk boundary when removing the overlap, and how
+# many clipped words Whisper may produce right at a cut
+STITCH_WINDOW_WORDS = 12
+STITCH_EDGE_SLOP = 2
+
+def _normalize_word(word: str) -> str:
+    return re.sub(r"[^\w']", "", word.lower())
+
+def _find_overlap(tail: List[str], head: List[str]):
+    """Longest run ending (almost) at the end of `tail` and starting (almost) at the start of `head`"""
+    for size in range(min(len(tail), len(head)), 1, -1):
+        for tail_skip in range(STITCH_EDGE_SLOP + 1):
+            for head_skip in range(STITCH_EDGE_SLOP + 1):
+                end = len(tail) - tail_skip
+                if end - size < 0 or head_skip + size > len(head):
+                    continue
+                if tail[end - size:end] == head[head_skip:head_skip + size]:
+                    return tail_skip, head_skip, size
+    return None
+
+def stitch_transcripts(texts: List[str]) -> str:
+    """Join chunk transcripts, dropping words repeated across the overlap
+    
+    The tail of the text so far and the head of the next chunk are aligned
+    on normalized words (case and punctuation ignored), allowing for a word
+    or two clipped at the cut. The longest shared run of at least two words
+    is kept once; otherwise the chunks are simply concatenated.
+    """
+    words: List[str] = []
+    for text in texts:
+        incoming = text.split()
+        if not words:
+            words = incoming
+            continue
+        
+        tail = [_normalize_word(w) for w in words[-STITCH_WINDOW_WORDS:]]
+        head = [_normalize_word(w) for w in incoming[:STITCH_WINDOW_WORDS]]
+        overlap = _find_overlap(tail, head)
+        
+        if overlap is None:
+            words = words + incoming
+        else:
+            tail_skip, head_skip, size = overlap
+            # Keep the earlier chunk's copy of the shared run
+            words = words[:len(words) - tail_skip] + incoming[head_skip + size:]
+    
+    return " ".join(words)
+
+def split_transcript(text: str, max_chars: int = ANALYSIS_SEGMENT_CHARS) -> List[str]:
+    """Split into about equal segments of at most `max_chars`, at sentence ends
+    
+    Falls back to word boundaries for a sentence longer than a segment.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text]
+    
+    target = len(text) / -(-len(text) // max_chars)
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        words = []
+        for word in sentence.split():
+            if words and len(" ".join(words)) + 1 + len(word) > target:
+                pieces.append(" ".join(words))
+                words = []
+            words.append(word)
+        if words:
+            pieces.append(" ".join(words))
+    
+    segments: List[str] = []
+    current = ""
+    for piece in pieces:
+        joined = f"{current} {piece}" if current else piece
+        if current and (len(joined) > max_chars or len(current) >= target):
+            segments.append(current)
+            joined = piece
+        current = joined
+    if current:
+        segments.append(current)
+    return segments
+
+def _interleave(lists: List[List[str]], limit: int) -> List[str]:
+    """Round-robin across lists, skipping case-insensitive duplicates"""
+    merged, seen = [], set()
+    for position in range(max((len(items) for items in lists), default=0)):
+        for items in lists:
+            if position < len(items):
+                key = str(items[position]).strip().lower()
+                if key and key not in seen:
+                    seen.add(key)
+                    merged.append(items[position])
+                    if len(merged) == limit:
+                        return merged
+    return merged
+
+def merge_analyses(parts: List[Dict], weights: List[float]) -> Dict:
+    """Reduce per-segment analyses into one, without another model call
+    
+    Sentiment is the length-weighted mean. Themes are ranked by how many
+    segments raised them (first appearance breaks ties); insights and goals
+    are taken in turn from each segment so no part of the entry dominates.
+    """
+    total = sum(weights) or 1.0
+    sentiment = sum(float(part.get("sentiment", 5)) * weight for part, weight in zip(parts, weights)) / total
+    
+    counts: Dict[str, int] = {}
+    labels: Dict[str, str] = {}
+    for part in parts:
+        for theme in dict.fromkeys(str(t).strip() for t in part.get("themes", [])):
+            key = theme.lower()
+            if key:
+                counts[key] = counts.get(key, 0) + 1
+                labels.setdefault(key, theme)
+    ranked = sorted(counts, key=lambda key: -counts[key])
+    
+    return {
+        "themes": [labels[key] for key in ranked[:5]],
+        "sentiment": round(sentiment, 1),
+        "insights": _interleave([part.get("insights", []) for part in parts], 3),
+        "goals": _interleave([part.get("goals", []) for part in parts], 3)
+    }
+
 class OpenAIService:
     def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
+        # One pooled async HTTP client shared by every request on this worker,
+        # so OpenAI calls never block the event loop
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENAI_MAX_KEEPALIVE
+            ),
+            timeout=httpx.Timeout(ANALYSIS_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=self.http_client,
+            # Retries are paced by the limiters instead
+            max_retries=0
         )
+        self.chat_limiter = RateLimiter(
+            "chat", OPENAI_CHAT_RPM, OPENAI_CHAT_TPM,
+            OPENAI_INITIAL_CONCURRENCY, OPENAI_MAX_CONCURRENCY, OPENAI_MAX_RETRIES
+        )
+        self.whisper_limiter = RateLimiter(
+            "whisper", OPENAI_WHISPER_RPM, None,
+            OPENAI_INITIAL_CONCURRENCY, OPENAI_MAX_CONCURRENCY, OPENAI_MAX_RETRIES
+        )
+        # Recent per-call latency of each analysis model: (EWMA seconds, updated at)
+        self.model_latency: Dict[str, tuple] = {}
+        self.transcription_hedger = Hedger(HEDGE_PERCENTILE, HEDGE_MAX_RATE) if HEDGE_ENABLED else None
     
-    async def transcribe_audio(self, audio_data: bytes) -> str:
+    async def close(self):
+        """Release pooled connections"""
+        await self.client.close()
+    
+    async def transcribe_audio(
+        self,
+        audio_data: AudioData,
+        filename: str = "audio.wav",
+        content_type: str = "audio/wav"
+    ) -> str:
         """Transcribe audio using OpenAI Whisper"""
-        try:
-            # Save audio temporarily
-            temp_file = "temp_audio.wav"
-            with open(temp_file, "wb") as f:
-                f.write(audio_data)
-            
-            # Transcribe
-            with open(temp_file, "rb") as f:
-                transcript = self.client.audio.transcriptions.create(
+        async def send() -> str:
+            # Stream straight from memory; the filename and MIME type tell
+            # Whisper the container format, so no temporary file is needed
+            with BufferReader(audio_data) as reader:
+                transcript = await self.client.audio.transcriptions.create(
                     model="whisper-1",
-                    file=f
+                    file=(filename, reader, content_type),
+                    timeout=TRANSCRIBE_TIMEOUT
                 )
-            
-            # Cleanup
-            os.remove(temp_file)
-            
             return transcript.text
+        
+        async def request() -> str:
+            return await self.whisper_limiter.call(send)
+        
+        try:
+            if self.transcription_hedger is None:
+                return await request()
+            # Each attempt gets its own reader over the same buffer
+            return await self.transcription_hedger.run(request)
             
         except Exception as e:
             raise Exception(f"Transcription failed: {str(e)}")
     
-    async def analyze_journal_entry(self, transcription: str) -> Dict:
-        """Analyze journal entry with GPT"""
+    def stats(self) -> Dict:
+        return {
+            "chat": self.chat_limiter.stats(),
+            "analysis_latency_seconds": {
+                model: round(seconds, 3) for model, (seconds, _) in self.model_latency.items()
+            },
+            "whisper": self.whisper_limiter.stats(),
+            "transcription_hedging": self.transcription_hedger.stats() if self.transcription_hedger else None
+        }
+    
+    async def transcribe_chunks(self, chunks: List[AudioData], concurrency: int = CHUNK_CONCURRENCY) -> str:
+        """Transcribe overlapping WAV chunks concurrently and stitch the text
+        
+        Latency is roughly that of the slowest chunk rather than the whole
+        recording; `concurrency` caps the simultaneous Whisper calls.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def transcribe_chunk(index: int, chunk: AudioData) -> str:
+            async with semaphore:
+                return await self.transcribe_audio(chunk, filename=f"chunk-{index}.wav")
+        
+        texts = await asyncio.gather(*(
+            transcribe_chunk(index, chunk) for index, chunk in enumerate(chunks)
+        ))
+        return stitch_transcripts(texts)
+    
+    def _recent_latency(self, model: str) -> Optional[float]:
+        recent = self.model_latency.get(model)
+        if recent is None or time.monotonic() - recent[1] > MODEL_LATENCY_MAX_AGE:
+            return None
+        return recent[0]
+    
+    def route_analysis(self, transcription: str, queue_depth: int = 0) -> Dict:
+        """Pick the analysis model for an entry; returns {"model", "reason"}
+        
+        Long entries are analyzed in concurrent segments, so the latency to
+        compare with the budget is that of a single call.
+        """
+        if len(transcription) < ANALYSIS_SHORT_CHARS:
+            return {"model": ANALYSIS_MODEL_SMALL, "reason": "short"}
+        if queue_depth >= ANALYSIS_BUSY_QUEUE_DEPTH:
+            return {"model": ANALYSIS_MODEL_SMALL, "reason": "queue_depth"}
+        latency = self._recent_latency(ANALYSIS_MODEL_LARGE)
+        if latency is not None and latency > ANALYSIS_LATENCY_BUDGET:
+            return {"model": ANALYSIS_MODEL_SMALL, "reason": "latency_budget"}
+        return {"model": ANALYSIS_MODEL_LARGE, "reason": "default"}
+    
+    async def analyze_journal_entry(self, transcription: str, model: str = ANALYSIS_MODEL_LARGE) -> Dict:
+        """Analyze journal entry with GPT
+        
+        Long entries are split into segments analyzed concurrently and then
+        merged, so latency stays close to that of a single segment. Raises
+        once the limiter's retries are exhausted, so the job queue retries
+        the analysis later instead of storing a placeholder.
+        """
         try:
-            prompt = f"""
-            Analyze this journal entry and provide insights:
+            segments = split_transcript(transcription)
+            if len(segments) == 1:
+                return await self._analyze_text(segments[0], model)
             
-            "{transcription}"
+            parts = await asyncio.gather(*(
+                self._analyze_text(segment, model, part=(index + 1, len(segments)))
+                for index, segment in enumerate(segments)
+            ))
+            return merge_analyses(list(parts), [len(segment) for segment in segments])
+            
+        except Exception as e:
+            raise Exception(f"Analysis failed: {str(e)}")
+    
+    @staticmethod
+    def _analysis_messages(text: str, part=None):
+        """Chat messages for one analysis and their estimated token cost"""
+        if part is None:
+            intro = "Analyze this journal entry and provide insights:"
+        else:
+            intro = f"This is part {part[0]} of {part[1]} of a long journal entry. Analyze this part and provide insights:"
+        prompt = f"""
+            {intro}
+            
+            "{text}"
             
             Please provide a JSON response with:
             1. themes: List of 3-5 key themes or topics mentioned
@@ -52,26 +341,86 @@ class OpenAIService:
             
             Format as valid JSON.
             """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a helpful AI assistant that analyzes journal entries to help people discover insights and set meaningful goals."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
-            
-            # Parse JSON response
-            analysis = json.loads(response.choices[0].message.content)
-            
-            return analysis
-            
+        messages = [
+            {"role": "system", "content": "You are a helpful AI assistant that analyzes journal entries to help people discover insights and set meaningful goals."},
+            {"role": "user", "content": prompt}
+        ]
+        # Roughly four characters per token
+        estimated_tokens = sum(len(m["content"]) for m in messages) / 4 + ANALYSIS_COMPLETION_TOKENS
+        return messages, estimated_tokens
+    
+    def _record_latency(self, model: str, seconds: float) -> None:
+        recent = self._recent_latency(model)
+        self.model_latency[model] = (seconds if recent is None else recent + 0.2 * (seconds - recent), time.monotonic())
+    
+    async def _analyze_text(self, text: str, model: str, part=None) -> Dict:
+        """One analysis call; `part` is (index, count) for a segment of a longer entry"""
+        messages, estimated_tokens = self._analysis_messages(text, part)
+        
+        started = time.monotonic()
+        response = await self.chat_limiter.call(
+            lambda: self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=0.7,
+                timeout=ANALYSIS_TIMEOUT
+            ),
+            tokens=estimated_tokens
+        )
+        self.chat_limiter.settle(estimated_tokens, response.usage.total_tokens if response.usage else None)
+        self._record_latency(model, time.monotonic() - started)
+        
+        # Parse JSON response
+        return json.loads(response.choices[0].message.content)
+    
+    async def stream_analysis(self, transcription: str, model: str = ANALYSIS_MODEL_LARGE) -> AsyncIterator[Tuple[str, Any]]:
+        """Analyze an entry, yielding progress as the completion streams in
+        
+        Yields ("token", text) for each piece of the completion and
+        ("field", (name, value)) as each top-level field is complete, then
+        ("analysis", result) once. Long entries go through the segmented
+        path and yield their merged fields at the end.
+        """
+        segments = split_transcript(transcription)
+        if len(segments) > 1:
+            analysis = await self.analyze_journal_entry(transcription, model)
+            for field in analysis.items():
+                yield "field", field
+            yield "analysis", analysis
+            return
+        
+        messages, estimated_tokens = self._analysis_messages(segments[0])
+        parser = PartialJSONObject()
+        usage = None
+        started = time.monotonic()
+        try:
+            async with self.chat_limiter.hold(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    temperature=0.7,
+                    timeout=ANALYSIS_TIMEOUT,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                ),
+                tokens=estimated_tokens
+            ) as stream:
+                try:
+                    async for chunk in stream:
+                        if chunk.usage is not None:
+                            usage = chunk.usage.total_tokens
+                        if not chunk.choices or not chunk.choices[0].delta.content:
+                            continue
+                        text = chunk.choices[0].delta.content
+                        yield "token", text
+                        for field in parser.feed(text):
+                            yield "field", field
+                finally:
+                    await stream.close()
+            analysis = parser.result()
         except Exception as e:
-            # Fallback response if AI fails
-            return {
-                "themes": ["reflection", "personal growth"],
-                "sentiment": 5.0,
-                "insights": ["User is engaging in self-reflection"],
-                "goals": ["Continue journaling regularly"]
-            }
+            raise Exception(f"Analysis failed: {str(e)}")
+        
+        self.chat_limiter.settle(estimated_tokens, usage)
+        self._record_latency(model, time.monotonic() - started)
+        yield "analysis", analysis
@@ -0,0 +1,85 @@
+"""
+Partial JSON Parsing for DayVibe
+Reads a JSON object as it streams in and reports each top-level field as
+soon as its value is complete
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PartialJSONObject:
+    """Incremental scanner for one streamed JSON object.
+
+    Tracks string and bracket state across chunks, so each character is
+    scanned once. Text before the opening brace (such as a Markdown code
+    fence) is skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.key: Optional[str] = None
+        self.key_start: Optional[int] = None
+        self.value_start: Optional[int] = None
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.fields: Dict[str, Any] = {}
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Add streamed text; returns the (name, value) fields it completed"""
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self.pos < len(text) and self.end is None:
+            ch = text[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                    if self.key_start is not None:
+                        self.key = json.loads(text[self.key_start:self.pos + 1])
+                        self.key_start = None
+            elif ch == '"':
+                self.in_string = True
+                if self.depth == 1 and self.key is None:
+                    self.key_start = self.pos
+            elif ch in "{[":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif self.depth == 1 and ch == ":" and self.key is not None:
+                self.value_start = self.pos + 1
+            elif self.depth == 1 and ch in ",}":
+                if self.value_start is not None:
+                    field = self._complete(text[self.value_start:self.pos])
+                    if field is not None:
+                        completed.append(field)
+                self.key = None
+                self.value_start = None
+                if ch == "}":
+                    self.depth = 0
+                    self.end = self.pos + 1
+            elif ch in "}]" and self.depth > 0:
+                self.depth -= 1
+            self.pos += 1
+        return completed
+
+    def _complete(self, value_text: str) -> Optional[Tuple[str, Any]]:
+        try:
+            value = json.loads(value_text)
+        except json.JSONDecodeError:
+            return None
+        self.fields[self.key] = value
+        return self.key, value
+
+    def result(self) -> Dict:
+        """The whole object; raises ValueError if it never closed or is invalid"""
+        if self.start is None or self.end is None:
+            raise ValueError("incomplete JSON object in response")
+        return json.loads(self.text[self.start:self.end])
@@ -0,0 +1,108 @@
+"""
+Stage Graph for DayVibe
+Runs request pipeline stages concurrently based on their dependencies
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class StageError(Exception):
+    """Raised when a pipeline stage fails or exceeds its timeout"""
+
+    def __init__(self, stage: str, error: BaseException):
+        self.stage = stage
+        self.error = error
+        self.timed_out = isinstance(error, asyncio.TimeoutError)
+        super().__init__(f"Stage '{stage}' failed: {str(error) or type(error).__name__}")
+
+
+class StageGraph:
+    """Small DAG of async stages.
+
+    Each stage starts as soon as the stages it depends on have finished and
+    receives their results as keyword arguments. Independent stages run
+    concurrently, and the first failure cancels every stage still running.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        depends_on: Optional[List[str]] = None,
+        timeout: Optional[float] = None
+    ) -> "StageGraph":
+        """Register a stage; dependencies must already be registered"""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+
+        depends_on = list(depends_on or [])
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dependency}'")
+
+        self.stages[name] = {
+            "func": func,
+            "depends_on": depends_on,
+            "timeout": timeout
+        }
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results keyed by stage name"""
+        results: Dict[str, Any] = {}
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str) -> Any:
+            stage = self.stages[name]
+
+            # Wait for upstream stages; their failure propagates unchanged
+            for dependency in stage["depends_on"]:
+                await tasks[dependency]
+
+            kwargs = {dependency: results[dependency] for dependency in stage["depends_on"]}
+            try:
+                result = await asyncio.wait_for(stage["func"](**kwargs), stage["timeout"])
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError as e:
+                raise StageError(name, e) from e
+            except StageError:
+                raise
+            except Exception as e:
+                raise StageError(name, e) from e
+
+            results[name] = result
+            return result
+
+        # Registration order is a valid topological order
+        for name in self.stages:
+            tasks[name] = asyncio.ensure_future(run_stage(name))
+
+        if not tasks:
+            return results
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            await self._cancel(tasks.values())
+            raise
+
+        if pending:
+            await self._cancel(pending)
+
+        # Report the stage that actually failed, not a dependent that re-raised it
+        for name, task in tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                raise task.exception()
+
+        return results
+
+    @staticmethod
+    async def _cancel(tasks) -> None:
+        """Cancel tasks and wait until they have unwound"""
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,255 @@
+"""
+Provider Rate Limiting for DayVibe
+Paces OpenAI calls under the account's request and token limits, adapts
+concurrency to how the provider is coping, and retries throttled calls
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import openai
+
+T = TypeVar("T")
+
+# Errors worth retrying; anything else (bad request, auth) fails at once
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError
+)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """The provider's requested wait from Retry-After(-ms), if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+class TokenBucket:
+    """Allows `per_minute` units a minute, refilled continuously"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        # A request larger than the whole bucket waits for a full one
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Return (or, if negative, take) units once the real cost is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on calls in flight.
+
+    Grows by about one slot per round of successful calls while the limit is
+    actually in use, and halves on a 429 or when recent latency climbs well
+    above its long-run level. Decreases are spaced at least one recent
+    latency apart, so one burst of 429s counts as one signal.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: int = 64, latency_tolerance: float = 2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.in_flight = 0
+        self.recent_latency: Optional[float] = None
+        self.baseline_latency: Optional[float] = None
+        self.last_decrease = 0.0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self) -> None:
+        async with self._changed:
+            self.in_flight -= 1
+            self._changed.notify_all()
+
+    def on_success(self, seconds: float, saturated: bool) -> None:
+        if self.recent_latency is None:
+            self.recent_latency = self.baseline_latency = seconds
+        else:
+            self.recent_latency += 0.2 * (seconds - self.recent_latency)
+            self.baseline_latency += 0.02 * (seconds - self.baseline_latency)
+
+        if self.recent_latency > self.latency_tolerance * self.baseline_latency:
+            self.decrease(0.9)
+        elif saturated:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+
+    def decrease(self, factor: float = 0.5) -> None:
+        now = time.monotonic()
+        if now - self.last_decrease < (self.recent_latency or 1.0):
+            return
+        self.last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+
+class RateLimiter:
+    """Token buckets, adaptive concurrency and retries for one provider limit.
+
+    Limits are per process: with several API workers, divide the account's
+    limits between them.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: Optional[float] = None,
+        concurrency: int = 8,
+        max_concurrency: int = 64,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 60.0
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        # A 429 holds every caller, not only the one that got it
+        self.paused_until = 0.0
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self.failures = 0
+
+    def backoff(self, attempt: int, error: Exception) -> float:
+        """Jittered exponential backoff, never shorter than the provider's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, 0.1 * retry_after + 0.05)
+        return delay
+
+    async def _admit(self, tokens: float) -> None:
+        while True:
+            wait = self.paused_until - time.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        await self.requests.acquire()
+        if self.tokens is not None and tokens:
+            await self.tokens.acquire(tokens)
+        await self.concurrency.acquire()
+
+    async def _start(self, request: Callable[[], Awaitable[T]], tokens: float) -> Tuple[T, float, bool]:
+        """Admit and await `request()`, retrying; returns with the concurrency slot still held"""
+        attempt = 0
+        while True:
+            await self._admit(tokens)
+            saturated = self.concurrency.in_flight >= int(self.concurrency.limit)
+            started = time.monotonic()
+            self.calls += 1
+            try:
+                return await request(), started, saturated
+            except RETRYABLE_ERRORS as e:
+                await self.concurrency.release()
+                if isinstance(e, openai.RateLimitError):
+                    self.throttled += 1
+                    self.concurrency.decrease()
+                    pause = retry_after_seconds(e)
+                    if pause:
+                        self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                elif isinstance(e, openai.APITimeoutError):
+                    self.concurrency.decrease()
+
+                if attempt >= self.max_retries:
+                    self.failures += 1
+                    raise
+                delay = self.backoff(attempt, e)
+                attempt += 1
+                self.retries += 1
+            except BaseException as e:
+                await self.concurrency.release()
+                if isinstance(e, Exception):
+                    self.failures += 1
+                raise
+
+            await asyncio.sleep(delay)
+
+    async def call(self, request: Callable[[], Awaitable[T]], tokens: float = 0) -> T:
+        """Await `request()` within the limits, retrying throttled and transient failures.
+
+        `tokens` is the estimated cost against the tokens-per-minute limit;
+        `settle` corrects it once the actual usage is known.
+        """
+        result, started, saturated = await self._start(request, tokens)
+        self.concurrency.on_success(time.monotonic() - started, saturated)
+        await self.concurrency.release()
+        return result
+
+    @asynccontextmanager
+    async def hold(self, request: Callable[[], Awaitable[T]], tokens: float = 0) -> AsyncIterator[T]:
+        """Like `call`, but the call keeps its slot until the block exits.
+
+        For streamed responses: only opening the stream is retried, and the
+        latency fed to the concurrency limit covers the whole stream.
+        """
+        result, started, saturated = await self._start(request, tokens)
+        try:
+            yield result
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.failures += 1
+            raise
+        else:
+            self.concurrency.on_success(time.monotonic() - started, saturated)
+        finally:
+            await self.concurrency.release()
+
+    def settle(self, estimated_tokens: float, actual_tokens: Optional[float]) -> None:
+        if self.tokens is not None and actual_tokens is not None:
+            self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def stats(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "failures": self.failures,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "recent_latency_seconds": round(self.concurrency.recent_latency, 3) if self.concurrency.recent_latency is not None else None
+        }
@@ -0,0 +1,111 @@
+"""
+Streak Engine for DayVibe
+Journaling streaks in the user's local time zone: a vectorized backfill over
+full history, and a constant-time update for each new entry
+"""
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TIMEZONE = "UTC"
+
+
+def resolve_timezone(name: Optional[str]) -> str:
+    """Validated IANA zone name, falling back to UTC"""
+    if not name:
+        return DEFAULT_TIMEZONE
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return DEFAULT_TIMEZONE
+    return name
+
+
+def local_date(moment: datetime, tz_name: Optional[str]) -> date:
+    """Calendar day of a timestamp in the user's zone; naive times are UTC"""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(ZoneInfo(resolve_timezone(tz_name))).date()
+
+
+def local_today(tz_name: Optional[str]) -> date:
+    return local_date(datetime.now(timezone.utc), tz_name)
+
+
+def parse_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def compute_streaks(timestamps: Iterable, tz_name: Optional[str]) -> Dict:
+    """Current and longest streak from a user's full entry history in one pass.
+
+    Timestamps are converted to local calendar days, de-duplicated and
+    split into runs of consecutive days with array operations, so years of
+    history cost a few vectorized passes rather than a Python loop.
+    """
+    tz_name = resolve_timezone(tz_name)
+    stamps = pd.to_datetime(pd.Series(list(timestamps), dtype="object"), utc=True, format="ISO8601")
+    if stamps.empty:
+        return {"streak_days": 0, "longest_streak": 0, "last_entry_date": None}
+
+    # Days since the epoch in the user's zone
+    local = stamps.dt.tz_convert(tz_name).dt.tz_localize(None)
+    days = np.unique(local.values.astype("datetime64[D]").astype(np.int64))
+
+    # A new run starts wherever the gap to the previous day isn't exactly one
+    run_starts = np.flatnonzero(np.diff(days) != 1) + 1
+    boundaries = np.concatenate(([0], run_starts, [days.size]))
+    run_lengths = np.diff(boundaries)
+
+    # streak_days is the run ending on the last entry day, as advance_streak
+    # keeps it; current_streak decides whether that run has lapsed
+    last_day = date(1970, 1, 1) + timedelta(days=int(days[-1]))
+
+    return {
+        "streak_days": int(run_lengths[-1]),
+        "longest_streak": int(run_lengths.max()),
+        "last_entry_date": last_day
+    }
+
+
+def advance_streak(state: Dict, entry_day: date) -> Dict:
+    """Apply one entry to stored streak state in O(1).
+
+    `state` holds streak_days, longest_streak and last_entry_date as kept in
+    user_stats. Entries older than last_entry_date can't be placed without
+    the full history and leave the streak unchanged; compute_streaks
+    rebuilds exact values when needed.
+    """
+    last_day = parse_date(state.get("last_entry_date"))
+    streak = state.get("streak_days") or 0
+    longest = state.get("longest_streak") or 0
+
+    if last_day is None:
+        streak, last_day = 1, entry_day
+    elif entry_day == last_day:
+        streak = max(streak, 1)
+    elif entry_day == last_day + timedelta(days=1):
+        streak, last_day = streak + 1, entry_day
+    elif entry_day > last_day:
+        streak, last_day = 1, entry_day
+
+    return {
+        "streak_days": streak,
+        "longest_streak": max(longest, streak),
+        "last_entry_date": last_day
+    }
+
+
+def current_streak(state: Dict, today: date) -> int:
+    """Streak as seen on `today`: it lapses once a full local day passes without an entry"""
+    last_day = parse_date(state.get("last_entry_date"))
+    if last_day is None or (today - last_day).days > 1:
+        return 0
+    return state.get("streak_days") or 0
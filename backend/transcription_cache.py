@@ -0,0 +1,109 @@
+"""
+Transcription Cache for DayVibe
+Persistent LRU cache of Whisper transcripts keyed by audio content hash
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from job_queue import DATA_DIR
+
+CACHE_DB_PATH = os.getenv("TRANSCRIPTION_CACHE_PATH", os.path.join(DATA_DIR, "transcriptions.db"))
+CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPTION_CACHE_MAX_ENTRIES", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcriptions (
+    audio_hash TEXT PRIMARY KEY,
+    transcription TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcriptions_lru ON transcriptions(last_used);
+"""
+
+
+def audio_hash(audio_data) -> str:
+    """SHA-256 of the audio bytes; accepts bytes or a memoryview without copying"""
+    return hashlib.sha256(audio_data).hexdigest()
+
+
+class TranscriptionCache:
+    """SQLite-backed LRU cache; survives restarts and is shared by workers"""
+
+    def __init__(self, db_path: str = CACHE_DB_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcription FROM transcriptions WHERE audio_hash = ?", (key,)
+            ).fetchone()
+            if row is None:
+                if count_miss:
+                    self.misses += 1
+                return None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE transcriptions SET last_used = ? WHERE audio_hash = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def _put(self, key: str, transcription: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO transcriptions (audio_hash, transcription, created_at, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(audio_hash) DO UPDATE SET transcription = excluded.transcription, last_used = excluded.last_used",
+                (key, transcription, now, now)
+            )
+
+            # Evict least recently used entries beyond the bound
+            count = self._conn.execute("SELECT COUNT(*) FROM transcriptions").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM transcriptions WHERE audio_hash IN "
+                    "(SELECT audio_hash FROM transcriptions ORDER BY last_used LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def _size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transcriptions").fetchone()[0]
+
+    async def get(self, key: str, count_miss: bool = True) -> Optional[str]:
+        """Cached transcription, if any; pass count_miss=False for lookups a
+        later one will repeat, so an upload only counts its miss once"""
+        return await asyncio.to_thread(self._get, key, count_miss)
+
+    async def put(self, key: str, transcription: str) -> None:
+        await asyncio.to_thread(self._put, key, transcription)
+
+    async def stats(self) -> Dict:
+        """Hit/miss counters for this process plus the persisted entry count"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": await asyncio.to_thread(self._size),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
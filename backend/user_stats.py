@@ -0,0 +1,110 @@
+"""
+User Statistics for DayVibe
+Keeps the user_stats row current on every write so reads are a single lookup
+"""
+import os
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+# Add shared directory to Python path
+shared_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'shared')
+if shared_dir not in sys.path:
+    sys.path.append(shared_dir)
+
+from async_database import async_db
+from streaks import advance_streak, compute_streaks, local_date, resolve_timezone
+
+# Optimistic-concurrency retries when two writes race on the same row
+MAX_UPDATE_ATTEMPTS = 5
+
+
+async def _update(user_id: str, apply) -> Dict:
+    """Read-modify-write the user's row, retrying if another writer got there first"""
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        stats = await async_db.get_user_stats(user_id)
+        if stats is None:
+            await async_db.create_user_stats(user_id)
+            continue
+
+        changes = apply(stats)
+        changes["version"] = (stats.get("version") or 0) + 1
+
+        # Only applies if nobody bumped the version since we read it
+        updated = await async_db.update_user_stats(user_id, stats.get("version") or 0, changes)
+        if updated:
+            return updated[0]
+
+    raise Exception(f"Could not update stats for user {user_id}: too much contention")
+
+
+async def record_entry(
+    user_id: Optional[str],
+    entry_time: datetime,
+    timezone_name: Optional[str] = None
+) -> Optional[Dict]:
+    """Count a new journal entry and advance the streak in constant time"""
+    if not user_id:
+        return None
+
+    def apply(stats: Dict) -> Dict:
+        # A zone sent by the client wins; otherwise use the one on file
+        tz_name = resolve_timezone(timezone_name or stats.get("timezone"))
+        streak = advance_streak(stats, local_date(entry_time, tz_name))
+        return {
+            "total_entries": (stats.get("total_entries") or 0) + 1,
+            "streak_days": streak["streak_days"],
+            "longest_streak": streak["longest_streak"],
+            "last_entry_date": streak["last_entry_date"].isoformat(),
+            "timezone": tz_name
+        }
+
+    return await _update(user_id, apply)
+
+
+async def rebuild_user_stats(user_id: str, timezone_name: Optional[str] = None) -> Dict:
+    """Recompute counts, streaks and mood from the user's full entry history"""
+    entries = await async_db.entry_history(user_id)
+    timestamps = [entry["created_at"] for entry in entries]
+    scores = [float(entry["mood_score"]) for entry in entries if entry.get("mood_score") is not None]
+
+    def apply(stats: Dict) -> Dict:
+        tz_name = resolve_timezone(timezone_name or stats.get("timezone"))
+        streak = compute_streaks(timestamps, tz_name)
+        last_entry = streak["last_entry_date"]
+        total = sum(scores)
+        return {
+            "total_entries": len(timestamps),
+            "streak_days": streak["streak_days"],
+            "longest_streak": streak["longest_streak"],
+            "last_entry_date": last_entry.isoformat() if last_entry else None,
+            "timezone": tz_name,
+            "mood_samples": len(scores),
+            "mood_total": total,
+            "avg_mood": round(total / len(scores), 2) if scores else 0.0
+        }
+
+    return await _update(user_id, apply)
+
+
+async def record_sentiment(
+    user_id: Optional[str],
+    sentiment: float,
+    previous: Optional[float] = None
+) -> Optional[Dict]:
+    """Fold an entry's sentiment into the running mean; `previous` is the score
+    a re-analysis replaces, so each entry is counted once"""
+    if not user_id or sentiment is None:
+        return None
+
+    def apply(stats: Dict) -> Dict:
+        # Keep the exact sum so the stored mean doesn't drift with rounding
+        samples = (stats.get("mood_samples") or 0) + (1 if previous is None else 0)
+        total = float(stats.get("mood_total") or 0.0) + float(sentiment) - float(previous or 0.0)
+        return {
+            "mood_samples": samples,
+            "mood_total": total,
+            "avg_mood": round(total / samples, 2)
+        }
+
+    return await _update(user_id, apply)
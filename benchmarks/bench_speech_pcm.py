@@ -0,0 +1,100 @@
+"""
+Speech PCM benchmark for DayVibe
+Measures peak memory and throughput of the fused decode/downmix/resample
+stage on a large memory-mapped recording, against a whole-file float copy
+
+Usage: python benchmarks/bench_speech_pcm.py [--minutes 30] [--rate 44100] [--channels 2]
+"""
+import argparse
+import mmap
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("backend", "shared"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# audio_processor builds a storage client on import; no requests are made
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJyb2xlIjoiYW5vbiJ9.bench")
+
+from audio_processor import TRANSCRIPTION_SAMPLE_RATE, decode_pcm, prepare_audio, to_speech_pcm
+
+
+def write_recording(path: str, minutes: float, rate: int, channels: int) -> None:
+    """16-bit WAV of tone bursts in noise, with pauses, written a minute at a time"""
+    rng = np.random.default_rng(42)
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        remaining = int(minutes * 60 * rate)
+        offset = 0
+        while remaining > 0:
+            frames = min(rate * 60, remaining)
+            t = (offset + np.arange(frames)) / rate
+            talking = (t % 7.0) < 4.5
+            signal = 0.3 * np.sin(2 * np.pi * 220 * t) * talking + 0.002 * rng.standard_normal(frames)
+            block = np.repeat((signal * 32767).astype(np.int16)[:, None], channels, axis=1)
+            wav.writeframes(block.tobytes())
+            remaining -= frames
+            offset += frames
+
+
+def whole_file(samples: np.ndarray, sample_rate: int):
+    """The unfused baseline: float copy of everything, then downmix and resample.
+
+    It skips the anti-aliasing filter, so its time flatters it; the memory
+    comparison is the point.
+    """
+    mono = samples.astype(np.float32).mean(axis=1)
+    total_out = int(mono.shape[0] * TRANSCRIPTION_SAMPLE_RATE / sample_rate)
+    positions = np.arange(total_out) * (sample_rate / TRANSCRIPTION_SAMPLE_RATE)
+    out = np.interp(positions, np.arange(mono.shape[0]), mono).astype(np.float32)
+    out /= max(float(np.abs(out).max()), 1e-9)
+    return out, TRANSCRIPTION_SAMPLE_RATE
+
+
+def measure(label: str, run, audio_seconds: float, input_bytes: int) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<14} {elapsed:7.2f}s  {audio_seconds / elapsed:8.0f}x realtime  "
+        f"{input_bytes / elapsed / 2 ** 20:7.0f} MB/s  peak {peak / 2 ** 20:8.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=30)
+    parser.add_argument("--rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "recording.wav")
+        write_recording(path, args.minutes, args.rate, args.channels)
+        size = os.path.getsize(path)
+        audio_seconds = args.minutes * 60
+        print(f"{args.minutes:g} min, {args.rate} Hz, {args.channels} ch: {size / 2 ** 20:.1f} MB input")
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            buffer = memoryview(mapped)
+            measure("whole file", lambda: whole_file(*decode_pcm(buffer)), audio_seconds, size)
+            measure("to_speech_pcm", lambda: to_speech_pcm(*decode_pcm(buffer)), audio_seconds, size)
+            measure("prepare_audio", lambda: prepare_audio(buffer), audio_seconds, size)
+            buffer.release()
+
+
+if __name__ == "__main__":
+    main()
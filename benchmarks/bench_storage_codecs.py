@@ -0,0 +1,86 @@
+"""
+Storage codec benchmark for DayVibe
+Encodes one recording with each archival codec at several levels and weighs
+encode time against the bytes saved over the original WAV
+
+Usage: python benchmarks/bench_storage_codecs.py [--minutes 10] [--rate 44100] [--channels 1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("backend", "shared"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+# audio_processor builds a storage client on import; no requests are made
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJyb2xlIjoiYW5vbiJ9.bench")
+
+from audio_processor import FFMPEG_BINARY, STORAGE_CODECS, ffmpeg_available
+from bench_speech_pcm import write_recording
+
+FLAC_LEVELS = ["0", "5", "8"]
+OPUS_BITRATES = ["16k", "24k", "32k", "48k"]
+
+
+def variants():
+    """(label, codec, ffmpeg args) for each setting, based on STORAGE_CODECS"""
+    flac = STORAGE_CODECS["flac"]
+    for level in FLAC_LEVELS:
+        args = list(flac["args"])
+        args[args.index("-compression_level") + 1] = level
+        yield f"flac -{level}", flac, args
+
+    opus = STORAGE_CODECS["opus"]
+    for bitrate in OPUS_BITRATES:
+        args = list(opus["args"])
+        args[args.index("-b:a") + 1] = bitrate
+        yield f"opus {bitrate}", opus, args
+
+
+def encode(source_path: str, target_path: str, codec: dict, args) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [FFMPEG_BINARY, "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+         "-i", source_path, "-vn", *args, "-f", codec["format"], target_path],
+        check=True
+    )
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--minutes", type=float, default=10)
+    parser.add_argument("--rate", type=int, default=44100)
+    parser.add_argument("--channels", type=int, default=1)
+    args = parser.parse_args()
+
+    if not ffmpeg_available():
+        sys.exit(f"{FFMPEG_BINARY} not found; the compressed codecs need it")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        source = os.path.join(scratch, "recording.wav")
+        write_recording(source, args.minutes, args.rate, args.channels)
+        size = os.path.getsize(source)
+        audio_seconds = args.minutes * 60
+        print(f"{args.minutes:g} min, {args.rate} Hz, {args.channels} ch: {size / 2 ** 20:.1f} MB wav")
+        print(f"{'codec':<10} {'encode':>8} {'speed':>10} {'size':>9} {'saved':>7} {'MB saved/s':>11}")
+
+        for label, codec, codec_args in variants():
+            target = os.path.join(scratch, f"encoded.{codec['extension']}")
+            elapsed = encode(source, target, codec, codec_args)
+            saved = size - os.path.getsize(target)
+            print(
+                f"{label:<10} {elapsed:7.2f}s {audio_seconds / elapsed:8.0f}x  "
+                f"{os.path.getsize(target) / 2 ** 20:6.1f} MB {saved / size:6.1%} "
+                f"{saved / elapsed / 2 ** 20:10.1f}"
+            )
+            os.remove(target)
+
+
+if __name__ == "__main__":
+    main()
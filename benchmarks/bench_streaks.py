@@ -0,0 +1,61 @@
+"""
+Streak engine benchmark for DayVibe
+Backfills users with years of history and replays their entries one by one
+
+Usage: python benchmarks/bench_streaks.py [--users 1000] [--years 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from streaks import advance_streak, compute_streaks, local_date
+
+ZONES = ["UTC", "America/New_York", "Europe/Berlin", "Asia/Kolkata", "Australia/Sydney", "Pacific/Auckland"]
+
+
+def history(rng: random.Random, years: int):
+    """ISO timestamps for one user: most days, sometimes twice, with gaps"""
+    moment = datetime(2020, 1, 1, tzinfo=timezone.utc) + timedelta(hours=rng.randrange(24))
+    end = moment + timedelta(days=365 * years)
+    stamps = []
+    while moment < end:
+        stamps.append(moment.isoformat())
+        moment += timedelta(hours=rng.choice([4, 20, 24, 24, 24, 26, 48, 96]))
+    return stamps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    users = [(history(rng, args.years), rng.choice(ZONES)) for _ in range(args.users)]
+    entries = sum(len(stamps) for stamps, _ in users)
+    print(f"{args.users} users, {args.years} years each, {entries} entries")
+
+    started = time.perf_counter()
+    for stamps, zone in users:
+        compute_streaks(stamps, zone)
+    backfill = time.perf_counter() - started
+    print(f"compute_streaks: {backfill:.2f}s total, {backfill / args.users * 1000:.2f} ms per user")
+
+    # advance_streak sees local days; converting them is part of each upload
+    parsed = [([datetime.fromisoformat(s) for s in stamps], zone) for stamps, zone in users]
+    started = time.perf_counter()
+    for stamps, zone in parsed:
+        state = {}
+        for moment in stamps:
+            state = advance_streak(state, local_date(moment, zone))
+    incremental = time.perf_counter() - started
+    print(f"advance_streak: {incremental / entries * 1e6:.1f} us per entry")
+
+
+if __name__ == "__main__":
+    main()
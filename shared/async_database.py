@@ -0,0 +1,301 @@
+"""
+Async data access layer for DayVibe
+Talks to Supabase's PostgREST API over a pooled HTTP/2 client so database
+round trips overlap with other requests instead of blocking the event loop
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from supabase_config import supabase_config
+
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "20"))
+DB_KEEPALIVE_SECONDS = float(os.getenv("DB_KEEPALIVE_SECONDS", "60"))
+DB_QUERY_TIMEOUT = float(os.getenv("DATABASE_TIMEOUT_SECONDS", "10"))
+
+
+class DatabaseError(Exception):
+    """Raised when a PostgREST request fails"""
+
+
+class AsyncDatabase:
+    def __init__(self, url: str, key: str):
+        self.client = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Content-Type": "application/json"
+            },
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=DB_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_MAX_CONNECTIONS,
+                keepalive_expiry=DB_KEEPALIVE_SECONDS
+            ),
+            timeout=DB_QUERY_TIMEOUT
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def _request(
+        self,
+        method: str,
+        table: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        prefer: Optional[str] = None,
+        timeout: Optional[float] = None
+    ) -> httpx.Response:
+        headers = {"Prefer": prefer} if prefer else {}
+        try:
+            response = await self.client.request(
+                method,
+                f"/{table}",
+                params=params,
+                json=json,
+                headers=headers,
+                timeout=timeout or DB_QUERY_TIMEOUT
+            )
+        except httpx.HTTPError as e:
+            raise DatabaseError(f"{method} {table} failed: {str(e) or type(e).__name__}") from e
+
+        if response.status_code >= 400:
+            raise DatabaseError(f"{method} {table} failed ({response.status_code}): {response.text}")
+        return response
+
+    # -- generic helpers --
+
+    async def select(
+        self,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        columns: str = "*",
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        conditions: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """Rows matching equality filters, e.g. filters={"id": 5}
+
+        `conditions` are raw PostgREST operators for anything else, e.g.
+        {"created_at": "lt.2024-01-01", "or": "(a.is.null,b.eq.1)"}.
+        """
+        params = {"select": columns}
+        for column, value in (filters or {}).items():
+            params[column] = f"eq.{value}"
+        params.update(conditions or {})
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = str(limit)
+        if offset:
+            params["offset"] = str(offset)
+
+        response = await self._request("GET", table, params=params, timeout=timeout)
+        return response.json()
+
+    async def insert(
+        self,
+        table: str,
+        row: Dict,
+        on_conflict: Optional[str] = None,
+        ignore_duplicates: bool = False,
+        timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """Insert (or upsert, when `on_conflict` is given) and return the stored rows"""
+        params = {}
+        prefer = "return=representation"
+        if on_conflict:
+            params["on_conflict"] = on_conflict
+            resolution = "ignore-duplicates" if ignore_duplicates else "merge-duplicates"
+            prefer = f"resolution={resolution},{prefer}"
+
+        response = await self._request("POST", table, params=params, json=row, prefer=prefer, timeout=timeout)
+        return response.json()
+
+    async def update(
+        self,
+        table: str,
+        filters: Dict[str, Any],
+        changes: Dict,
+        timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """Apply changes to rows matching equality filters; returns the updated rows"""
+        params = {column: f"eq.{value}" for column, value in filters.items()}
+        response = await self._request(
+            "PATCH", table, params=params, json=changes, prefer="return=representation", timeout=timeout
+        )
+        return response.json()
+
+    async def delete(
+        self,
+        table: str,
+        filters: Dict[str, Any],
+        timeout: Optional[float] = None
+    ) -> List[Dict]:
+        """Delete rows matching equality filters; returns the deleted rows"""
+        params = {column: f"eq.{value}" for column, value in filters.items()}
+        response = await self._request(
+            "DELETE", table, params=params, prefer="return=representation", timeout=timeout
+        )
+        return response.json()
+
+    async def count(
+        self,
+        table: str,
+        filters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
+    ) -> int:
+        """Exact row count without transferring rows"""
+        params = {column: f"eq.{value}" for column, value in (filters or {}).items()}
+        params["select"] = "id"
+        response = await self._request("HEAD", table, params=params, prefer="count=exact", timeout=timeout)
+
+        # Content-Range looks like "0-24/25" or "*/0"
+        content_range = response.headers.get("content-range", "*/0")
+        total = content_range.rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def rpc(self, function: str, params: Dict, timeout: Optional[float] = None) -> Any:
+        """Call a SQL function exposed by PostgREST"""
+        response = await self._request("POST", f"rpc/{function}", json=params, timeout=timeout)
+        return response.json()
+
+    # -- journal entries --
+
+    async def insert_entry(self, entry: Dict) -> Dict:
+        rows = await self.insert("journal_entries", entry)
+        return rows[0]
+
+    async def get_entry(self, entry_id, columns: str = "*") -> Optional[Dict]:
+        rows = await self.select("journal_entries", {"id": entry_id}, columns=columns, limit=1)
+        return rows[0] if rows else None
+
+    async def update_entry(self, entry_id, changes: Dict) -> List[Dict]:
+        return await self.update("journal_entries", {"id": entry_id}, changes)
+
+    async def delete_entry(self, entry_id) -> List[Dict]:
+        """Delete an entry; its analyses go with it (ON DELETE CASCADE)"""
+        return await self.delete("journal_entries", {"id": entry_id})
+
+    async def count_waveform_refs(self, waveform_path: str) -> int:
+        """Entries still using a (content-addressed, shareable) waveform object"""
+        return await self.count("journal_entries", {"waveform_path": waveform_path})
+
+    # -- AI analysis --
+
+    async def get_analysis(
+        self,
+        entry_id,
+        transcription_hash: Optional[str] = None,
+        prompt_version: Optional[str] = None
+    ) -> Optional[Dict]:
+        """Latest analysis for an entry, optionally for a specific transcript and prompt"""
+        filters = {"entry_id": entry_id}
+        if transcription_hash is not None:
+            filters["transcription_hash"] = transcription_hash
+        if prompt_version is not None:
+            filters["prompt_version"] = prompt_version
+
+        rows = await self.select("ai_analysis", filters, order="created_at.desc", limit=1)
+        return rows[0] if rows else None
+
+    async def insert_analysis(self, analysis: Dict) -> Optional[Dict]:
+        """Insert once per (entry, transcript, prompt version); duplicates are ignored"""
+        rows = await self.insert(
+            "ai_analysis",
+            analysis,
+            on_conflict="entry_id,transcription_hash,prompt_version",
+            ignore_duplicates=True
+        )
+        return rows[0] if rows else None
+
+    # -- audio blobs --
+
+    async def acquire_blob(self, blob_hash: str) -> Optional[Dict]:
+        """Add a reference to a stored blob; None if no blob has this hash yet"""
+        rows = await self.rpc("acquire_audio_blob", {"p_hash": blob_hash})
+        return rows[0] if rows else None
+
+    async def register_blob(self, blob_hash: str, storage_path: str, content_type: str, size_bytes: int) -> Dict:
+        """Record a newly uploaded blob with one reference.
+
+        If a concurrent upload registered the hash first, that row wins and
+        gains the reference instead.
+        """
+        rows = await self.rpc("register_audio_blob", {
+            "p_hash": blob_hash,
+            "p_storage_path": storage_path,
+            "p_content_type": content_type,
+            "p_size_bytes": size_bytes
+        })
+        return rows[0]
+
+    async def get_blob(self, blob_hash: str) -> Optional[Dict]:
+        rows = await self.select("audio_blobs", {"hash": blob_hash}, limit=1)
+        return rows[0] if rows else None
+
+    async def update_blob(self, blob_hash: str, expected_tier: str, changes: Dict) -> List[Dict]:
+        """Compare-and-set on `tier`; returns [] if the blob moved on meanwhile"""
+        return await self.update("audio_blobs", {"hash": blob_hash, "tier": expected_tier}, changes)
+
+    async def touch_blob(self, blob_hash: str, accessed_at: str) -> List[Dict]:
+        """Record when a blob was last played"""
+        return await self.update("audio_blobs", {"hash": blob_hash}, {"last_accessed_at": accessed_at})
+
+    async def point_entries_at_blob(self, blob_hash: str, audio_url: str) -> List[Dict]:
+        """Rewrite audio_url on every entry that references a blob"""
+        return await self.update("journal_entries", {"audio_blob_hash": blob_hash}, {"audio_url": audio_url})
+
+    async def release_blob(self, blob_hash: str) -> Optional[Dict]:
+        """Drop a reference; a returned ref_count of 0 means the row is gone
+        and the caller should remove the stored object"""
+        rows = await self.rpc("release_audio_blob", {"p_hash": blob_hash})
+        return rows[0] if rows else None
+
+    # -- user stats --
+
+    async def entry_history(self, user_id, page_size: int = 1000) -> List[Dict]:
+        """Creation time and mood score of every entry a user has, oldest first"""
+        entries: List[Dict] = []
+        while True:
+            rows = await self.select(
+                "journal_entries",
+                {"user_id": user_id},
+                columns="created_at,mood_score",
+                order="created_at.asc",
+                limit=page_size,
+                offset=len(entries)
+            )
+            entries.extend(rows)
+            if len(rows) < page_size:
+                return entries
+
+    async def get_user_stats(self, user_id) -> Optional[Dict]:
+        rows = await self.select("user_stats", {"user_id": user_id}, limit=1)
+        return rows[0] if rows else None
+
+    async def create_user_stats(self, user_id) -> None:
+        """Create an empty stats row; a concurrent create is ignored"""
+        await self.insert(
+            "user_stats",
+            {"user_id": user_id},
+            on_conflict="user_id",
+            ignore_duplicates=True
+        )
+
+    async def update_user_stats(self, user_id, expected_version: int, changes: Dict) -> List[Dict]:
+        """Compare-and-set on `version`; returns [] if another writer got there first"""
+        return await self.update(
+            "user_stats",
+            {"user_id": user_id, "version": expected_version},
+            changes
+        )
+
+
+# Global instance
+async_db = AsyncDatabase(supabase_config.url, supabase_config.server_key)
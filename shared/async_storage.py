@@ -0,0 +1,97 @@
+"""
+Async storage access for DayVibe
+Streams objects from Supabase Storage over a pooled HTTP/2 client, passing
+Range and conditional headers through so partial reads never fetch the
+whole file
+"""
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import unquote
+
+import httpx
+
+from supabase_config import supabase_config
+
+STORAGE_MAX_CONNECTIONS = int(os.getenv("STORAGE_MAX_CONNECTIONS", "20"))
+STORAGE_CONNECT_TIMEOUT = float(os.getenv("STORAGE_CONNECT_TIMEOUT_SECONDS", "5"))
+STORAGE_READ_TIMEOUT = float(os.getenv("STORAGE_READ_TIMEOUT_SECONDS", "30"))
+
+# Request headers forwarded to storage for partial and conditional reads
+PASSTHROUGH_HEADERS = ("range", "if-range", "if-none-match", "if-modified-since")
+
+
+class StorageError(Exception):
+    """Raised when a storage request fails"""
+
+
+class AsyncStorage:
+    def __init__(self, url: str, key: str):
+        self.url = url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.url}/storage/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}"
+            },
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=STORAGE_MAX_CONNECTIONS,
+                max_keepalive_connections=STORAGE_MAX_CONNECTIONS
+            ),
+            timeout=httpx.Timeout(STORAGE_READ_TIMEOUT, connect=STORAGE_CONNECT_TIMEOUT)
+        )
+
+    async def close(self):
+        await self.client.aclose()
+
+    @staticmethod
+    def object_location(object_url: Optional[str]) -> Optional[Tuple[str, str]]:
+        """(bucket, object path) from an authenticated or (older rows) public object URL"""
+        for marker in ("/object/authenticated/", "/object/public/"):
+            if object_url and marker in object_url:
+                location = unquote(object_url.split(marker, 1)[1].split("?", 1)[0])
+                bucket, _, path = location.partition("/")
+                return (bucket, path) if path else None
+        return None
+
+    async def open_object(self, bucket: str, path: str, request_headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """Start streaming an object; the caller must `aclose()` the response.
+
+        Range and conditional headers from `request_headers` are passed
+        through, so the response may be 206, 304 or 416 as well as 200.
+        """
+        headers = {
+            name: value
+            for name, value in (request_headers or {}).items()
+            if name.lower() in PASSTHROUGH_HEADERS
+        }
+        request = self.client.build_request("GET", f"/object/{bucket}/{path}", headers=headers)
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise StorageError(f"GET {bucket}/{path} failed: {str(e) or type(e).__name__}") from e
+
+        if response.status_code >= 400 and response.status_code != 416:
+            await response.aread()
+            await response.aclose()
+            raise StorageError(f"GET {bucket}/{path} failed ({response.status_code}): {response.text}")
+        return response
+
+    async def download(self, bucket: str, path: str, dest_path: str, chunk_size: int = 256 * 1024) -> int:
+        """Stream an object to a local file; returns the bytes written"""
+        response = await self.open_object(bucket, path)
+        written = 0
+        try:
+            with open(dest_path, "wb") as f:
+                async for chunk in response.aiter_bytes(chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+        except httpx.HTTPError as e:
+            raise StorageError(f"GET {bucket}/{path} failed: {str(e) or type(e).__name__}") from e
+        finally:
+            await response.aclose()
+        return written
+
+
+# Global instance
+async_storage = AsyncStorage(supabase_config.url, supabase_config.server_key)
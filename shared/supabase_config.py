@@ -15,9 +15,23 @@ class SupabaseConfig:
             raise ValueError("Supabase URL and ANON KEY must be set in environment variables")
         
         self.client: Client = create_client(self.url, self.key)
+        
+        # Server-side code (the FastAPI backend) uses the service role key,
+        # which bypasses RLS; it must never reach a browser
+        self.service_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+        self.server_key = self.service_key or self.key
+        self._service_client = None
     
     def get_client(self) -> Client:
         return self.client
+    
+    def get_service_client(self) -> Client:
+        """Client for server-side code, with the service role key when it's set"""
+        if self.service_key is None:
+            return self.client
+        if self._service_client is None:
+            self._service_client = create_client(self.url, self.service_key)
+        return self._service_client
 
 # Global instance
 supabase_config = SupabaseConfig()
@@ -26,6 +26,114 @@ CREATE TABLE IF NOT EXISTS journal_entries (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 2b. Processing status for the background transcription/analysis pipeline
+--     pending -> transcribing -> analyzing -> processed (or failed)
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS status VARCHAR(20) DEFAULT 'pending';
+
+-- Silence trimmed before transcription, and the kept segments' positions in
+-- the original recording (output_start, original_start, duration in seconds)
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS silence_removed_seconds REAL;
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS speech_segments JSONB;
+
+-- Storage path of the entry's waveform preview (binary min/max peaks)
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS waveform_path TEXT;
+
+-- 2c. Create ai_analysis table for generated insights
+CREATE TABLE IF NOT EXISTS ai_analysis (
+    id BIGSERIAL PRIMARY KEY,
+    entry_id BIGINT REFERENCES journal_entries(id) ON DELETE CASCADE,
+    themes JSONB,
+    sentiment FLOAT,
+    insights TEXT[],
+    suggested_goals TEXT[],
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- 2d. Analysis results are keyed by transcript and prompt version so repeated
+--     requests reuse the stored row instead of calling the model again
+ALTER TABLE ai_analysis ADD COLUMN IF NOT EXISTS transcription_hash VARCHAR(64);
+ALTER TABLE ai_analysis ADD COLUMN IF NOT EXISTS prompt_version VARCHAR(20);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_analysis_cache_key
+    ON ai_analysis(entry_id, transcription_hash, prompt_version);
+
+-- Model each analysis was routed to, why, and how long it took, for auditing
+-- the quality/latency tradeoff (reason: short, queue_depth, latency_budget, default)
+ALTER TABLE ai_analysis ADD COLUMN IF NOT EXISTS model VARCHAR(50);
+ALTER TABLE ai_analysis ADD COLUMN IF NOT EXISTS routing_reason VARCHAR(20);
+ALTER TABLE ai_analysis ADD COLUMN IF NOT EXISTS latency_ms INTEGER;
+
+-- 2e. Content-addressed recordings: each distinct upload is stored once under
+--     blobs/ keyed by its SHA-256, and entries reference it by hash
+CREATE TABLE IF NOT EXISTS audio_blobs (
+    hash VARCHAR(64) PRIMARY KEY,
+    storage_path TEXT NOT NULL,
+    content_type VARCHAR(100),
+    size_bytes BIGINT,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE journal_entries ADD COLUMN IF NOT EXISTS audio_blob_hash VARCHAR(64) REFERENCES audio_blobs(hash);
+
+-- Reference counts change in a single statement, so concurrent uploads of
+-- the same audio can't lose an increment
+CREATE OR REPLACE FUNCTION acquire_audio_blob(p_hash TEXT)
+RETURNS SETOF audio_blobs AS $$
+    UPDATE audio_blobs SET ref_count = ref_count + 1 WHERE hash = p_hash RETURNING *;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION register_audio_blob(p_hash TEXT, p_storage_path TEXT, p_content_type TEXT, p_size_bytes BIGINT)
+RETURNS SETOF audio_blobs AS $$
+    INSERT INTO audio_blobs (hash, storage_path, content_type, size_bytes, ref_count)
+    VALUES (p_hash, p_storage_path, p_content_type, p_size_bytes, 1)
+    ON CONFLICT (hash) DO UPDATE SET ref_count = audio_blobs.ref_count + 1
+    RETURNING *;
+$$ LANGUAGE sql;
+
+-- The last reference deletes the row (the row lock keeps a concurrent acquire
+-- out meanwhile) and returns it with ref_count 0 so the caller removes the
+-- object. An entry still pointing at the blob fails the foreign key instead
+CREATE OR REPLACE FUNCTION release_audio_blob(p_hash TEXT)
+RETURNS SETOF audio_blobs AS $$
+DECLARE
+    released audio_blobs;
+BEGIN
+    UPDATE audio_blobs SET ref_count = GREATEST(ref_count - 1, 0) WHERE hash = p_hash RETURNING * INTO released;
+    IF released.hash IS NULL THEN
+        RETURN;
+    END IF;
+    IF released.ref_count = 0 THEN
+        DELETE FROM audio_blobs WHERE hash = p_hash;
+    END IF;
+    RETURN NEXT released;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Blob bookkeeping is the backend's alone: RLS with no policies hides the
+-- table from clients, and only the service role may call the functions
+ALTER TABLE audio_blobs ENABLE ROW LEVEL SECURITY;
+REVOKE EXECUTE ON FUNCTION acquire_audio_blob(TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION register_audio_blob(TEXT, TEXT, TEXT, BIGINT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION release_audio_blob(TEXT) FROM PUBLIC, anon, authenticated;
+
+-- 2f. Storage tiers: blobs nobody has played for a while are re-encoded into
+--     a compact cold tier and moved back when played again. The previous_*
+--     columns hold the old object while a move is being finished
+ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS tier VARCHAR(10) NOT NULL DEFAULT 'hot';
+ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS storage_bucket TEXT NOT NULL DEFAULT 'audio-recordings';
+ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS previous_storage_bucket TEXT;
+ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS previous_storage_path TEXT;
+ALTER TABLE audio_blobs ADD COLUMN IF NOT EXISTS last_accessed_at TIMESTAMP WITH TIME ZONE;
+CREATE INDEX IF NOT EXISTS idx_audio_blobs_tier ON audio_blobs(tier, hash);
+CREATE INDEX IF NOT EXISTS idx_journal_entries_blob ON journal_entries(audio_blob_hash);
+
+-- 2g. Recordings and waveform previews live in a private bucket. With no
+--     storage policies only the backend (service role) can read them; users
+--     play their own recordings through /api/entries/{id}/audio
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('audio-recordings', 'audio-recordings', false)
+ON CONFLICT (id) DO UPDATE SET public = false;
+
 -- 3. Create user_stats table for tracking user statistics
 CREATE TABLE IF NOT EXISTS user_stats (
     id BIGSERIAL PRIMARY KEY,
@@ -38,16 +146,32 @@ CREATE TABLE IF NOT EXISTS user_stats (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- 3b. Incrementally maintained stats: the API updates this row on every write
+--     (compare-and-set on version) instead of scanning entries and analyses
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS mood_samples INTEGER DEFAULT 0;
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS mood_total DOUBLE PRECISION DEFAULT 0;
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS version INTEGER DEFAULT 0;
+-- Streaks are counted in the user's local calendar days
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS longest_streak INTEGER DEFAULT 0;
+ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS timezone VARCHAR(64) DEFAULT 'UTC';
+-- Sentiment is scored 1-10, which doesn't fit DECIMAL(3,2)
+ALTER TABLE user_stats ALTER COLUMN avg_mood TYPE DECIMAL(4,2);
+-- An entry's mood_score is its latest analysis sentiment; the mood average
+-- counts it once per entry, and rebuilds are recomputed from it
+ALTER TABLE journal_entries ALTER COLUMN mood_score TYPE DECIMAL(4,2);
+
 -- 4. Add indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_signups_email ON signups(email);
 CREATE INDEX IF NOT EXISTS idx_signups_date ON signups(signup_date);
 CREATE INDEX IF NOT EXISTS idx_journal_entries_user_date ON journal_entries(user_id, entry_date DESC);
 CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id);
+CREATE INDEX IF NOT EXISTS idx_ai_analysis_entry ON ai_analysis(entry_id, created_at DESC);
 
 -- 5. Enable Row Level Security (RLS) for better security
 ALTER TABLE signups ENABLE ROW LEVEL SECURITY;
 ALTER TABLE journal_entries ENABLE ROW LEVEL SECURITY;
 ALTER TABLE user_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ai_analysis ENABLE ROW LEVEL SECURITY;
 
 -- 6. Create RLS policies
 
@@ -82,6 +206,17 @@ CREATE POLICY "Users can read own stats" ON user_stats
 CREATE POLICY "Users can update own stats" ON user_stats
     FOR UPDATE USING (auth.uid() = user_id);
 
+-- Users can read analyses of their own entries; only the backend (service
+-- role, which bypasses RLS) writes them
+CREATE POLICY "Users can read own analyses" ON ai_analysis
+    FOR SELECT USING (
+        EXISTS (
+            SELECT 1 FROM journal_entries
+            WHERE journal_entries.id = ai_analysis.entry_id
+              AND journal_entries.user_id = auth.uid()
+        )
+    );
+
 -- 7. Create function to update timestamp automatically
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -0,0 +1,19 @@
+"""
+Test configuration for DayVibe
+Puts backend/ and shared/ on the import path and points every service at
+placeholder credentials and a scratch data directory
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("backend", "shared"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.eyJyb2xlIjoiYW5vbiJ9.test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DAYVIBE_DATA_DIR", tempfile.mkdtemp(prefix="dayvibe-tests-"))
@@ -0,0 +1,37 @@
+"""
+Audio probe tests for DayVibe
+Header parsing accepts real recordings and refuses empty ones before they
+reach the audio pipeline
+"""
+import io
+import wave
+
+import pytest
+
+from audio_probe import InvalidAudioFile, probe_audio
+
+
+def wav_bytes(frames: int, rate: int = 16000, channels: int = 1) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\x00\x00" * channels * frames)
+    return out.getvalue()
+
+
+def test_wav_header_gives_rate_channels_and_duration():
+    metadata = probe_audio(wav_bytes(32000, rate=16000, channels=2))
+    assert metadata == {"sample_rate": 16000, "channels": 2, "duration_seconds": 2.0, "container": "wav"}
+
+
+def test_zero_frame_wav_is_rejected():
+    with pytest.raises(InvalidAudioFile, match="no audio frames"):
+        probe_audio(wav_bytes(0))
+
+
+def test_wav_shorter_than_one_frame_is_rejected():
+    # A stray byte of data is still less than one stereo frame
+    with pytest.raises(InvalidAudioFile):
+        probe_audio(wav_bytes(0, channels=2) + b"\x00")
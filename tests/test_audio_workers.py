@@ -0,0 +1,32 @@
+"""
+Audio worker pool tests for DayVibe
+A worker dying mid-call breaks the process pool; the pool is replaced and
+the call retried instead of failing every later job
+"""
+import asyncio
+import os
+
+from audio_workers import AudioWorkerPool
+
+
+def die_once(marker: str) -> str:
+    """Kills its worker process the first time it runs"""
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return "ok"
+
+
+def test_broken_pool_is_replaced_and_the_call_retried(tmp_path):
+    pool = AudioWorkerPool(max_workers=1)
+
+    async def scenario():
+        try:
+            first = await pool.run(die_once, str(tmp_path / "died"))
+            second = await pool.run(die_once, str(tmp_path / "died"))
+            return first, second
+        finally:
+            pool.shutdown()
+
+    assert asyncio.run(scenario()) == ("ok", "ok")
+    assert pool.restarts == 1 and pool.completed == 2
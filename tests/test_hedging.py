@@ -0,0 +1,46 @@
+"""
+Request hedging tests for DayVibe
+The latency histogram must keep seeing slow first attempts, including the
+ones a hedge wins and cancels
+"""
+import asyncio
+
+from hedging import Hedger
+
+
+def test_cancelled_primary_is_recorded():
+    hedger = Hedger(percentile=50, min_samples=1)
+    hedger.histogram.record(0.01)
+    delays = iter([0.5, 0.0])
+
+    async def call():
+        await asyncio.sleep(next(delays))
+        return "ok"
+
+    assert asyncio.run(hedger.run(call)) == "ok"
+    assert hedger.hedges == 1 and hedger.hedge_wins == 1
+    # One sample for the cancelled primary, which ran at least until the
+    # hedge started; none for the hedge itself
+    assert len(hedger.histogram.samples) == 2
+    assert hedger.histogram.samples[-1] >= 0.01
+
+
+def test_slow_primaries_raise_the_hedge_delay():
+    hedger = Hedger(percentile=50, min_samples=1, max_rate=1.0)
+    hedger.histogram.record(0.01)
+
+    async def slow_primary():
+        attempt = {"n": 0}
+
+        async def call():
+            attempt["n"] += 1
+            await asyncio.sleep(0.2 if attempt["n"] == 1 else 0.0)
+            return "ok"
+
+        for _ in range(5):
+            attempt["n"] = 0
+            await hedger.run(call)
+
+    asyncio.run(slow_primary())
+    # Without the cancelled primaries the window would hold only 0.01
+    assert hedger.histogram.percentile(50) > 0.01
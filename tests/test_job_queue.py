@@ -0,0 +1,50 @@
+"""
+Job queue tests for DayVibe
+Acquiring a job in the request path shares the single-flight slot with
+queued and worker-claimed jobs
+"""
+import asyncio
+
+from job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+def test_acquire_creates_a_running_job_once():
+    async def scenario():
+        queue = JobQueue(":memory:")
+        job, owner = await queue.acquire("analyze", {"entry_id": 1}, "analyze:1")
+        again, second_owner = await queue.acquire("analyze", {"entry_id": 1}, "analyze:1")
+        return job, owner, again, second_owner
+
+    job, owner, again, second_owner = asyncio.run(scenario())
+    assert owner and job["status"] == RUNNING and job["attempts"] == 1
+    assert not second_owner and again["id"] == job["id"]
+
+
+def test_acquire_takes_over_a_queued_job():
+    async def scenario():
+        queue = JobQueue(":memory:")
+        job_id = await queue.enqueue("analyze", {"entry_id": 1}, dedupe_key="analyze:1")
+        job, owner = await queue.acquire("analyze", {"entry_id": 1}, "analyze:1")
+        # A worker finds nothing left to claim
+        claimed = await queue.claim(["analyze"])
+        return job_id, job, owner, claimed
+
+    job_id, job, owner, claimed = asyncio.run(scenario())
+    assert owner and job["id"] == job_id
+    assert claimed is None
+
+
+def test_released_job_goes_back_to_the_workers_uncounted():
+    async def scenario():
+        queue = JobQueue(":memory:")
+        job, _ = await queue.acquire("analyze", {"entry_id": 1}, "analyze:1")
+        await queue.release(job["id"])
+        released = await queue.get(job["id"])
+        claimed = await queue.claim(["analyze"])
+        await queue.complete(claimed["id"])
+        return job, released, claimed, await queue.get(job["id"])
+
+    job, released, claimed, finished = asyncio.run(scenario())
+    assert released["status"] == QUEUED and released["attempts"] == 0
+    assert claimed["id"] == job["id"] and claimed["attempts"] == 1
+    assert finished["status"] == DONE
@@ -0,0 +1,95 @@
+"""
+Tests for the OpenAI service: calls share one async connection pool and
+overlap instead of running one after another
+"""
+import asyncio
+import json
+import time
+
+import httpx
+import openai
+
+from openai_service import OPENAI_INITIAL_CONCURRENCY, OpenAIService
+
+DELAY = 0.2
+ANALYSIS = {"themes": ["work"], "sentiment": 6, "insights": ["busy day"], "goals": ["rest"]}
+
+
+async def delayed_openai(request: httpx.Request) -> httpx.Response:
+    """Fake OpenAI API that takes DELAY seconds per request"""
+    await asyncio.sleep(DELAY)
+    if request.url.path.endswith("/audio/transcriptions"):
+        return httpx.Response(200, json={"text": "hello"})
+    return httpx.Response(200, json={
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4",
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": json.dumps(ANALYSIS)},
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150}
+    })
+
+
+def make_service(handler=delayed_openai) -> OpenAIService:
+    service = OpenAIService()
+    service.client = openai.AsyncOpenAI(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        max_retries=0
+    )
+    return service
+
+
+async def timed(calls):
+    started = time.monotonic()
+    results = await asyncio.gather(*calls)
+    return results, time.monotonic() - started
+
+
+def test_concurrent_transcriptions_overlap():
+    async def run():
+        service = make_service()
+        calls = [service.transcribe_audio(b"RIFF" + bytes(100)) for _ in range(OPENAI_INITIAL_CONCURRENCY)]
+        results, elapsed = await timed(calls)
+        await service.close()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert results == ["hello"] * OPENAI_INITIAL_CONCURRENCY
+    # Serially this would take OPENAI_INITIAL_CONCURRENCY * DELAY
+    assert elapsed < 2 * DELAY
+
+
+def test_concurrent_analyses_overlap():
+    async def run():
+        service = make_service()
+        calls = [service.analyze_journal_entry("A long day at work.") for _ in range(OPENAI_INITIAL_CONCURRENCY)]
+        results, elapsed = await timed(calls)
+        await service.close()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert results == [ANALYSIS] * OPENAI_INITIAL_CONCURRENCY
+    assert elapsed < 2 * DELAY
+
+
+def test_event_loop_stays_responsive_during_calls():
+    async def run():
+        service = make_service()
+        lags = []
+
+        async def ticker():
+            for _ in range(int(DELAY / 0.01)):
+                started = time.monotonic()
+                await asyncio.sleep(0.01)
+                lags.append(time.monotonic() - started - 0.01)
+
+        await asyncio.gather(ticker(), *(service.transcribe_audio(b"RIFF" + bytes(100)) for _ in range(4)))
+        await service.close()
+        return max(lags)
+
+    assert asyncio.run(run()) < 0.05
@@ -0,0 +1,114 @@
+"""
+Tests for the streak engine across DST changes and time-zone boundaries
+"""
+import random
+from datetime import date, datetime, timedelta, timezone
+
+from streaks import advance_streak, compute_streaks, current_streak, local_date, resolve_timezone
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def replay(timestamps, tz_name):
+    """Streak state built entry by entry with advance_streak"""
+    state = {}
+    for moment in sorted(timestamps):
+        state = advance_streak(state, local_date(moment, tz_name))
+    return state
+
+
+def test_local_day_follows_the_users_zone():
+    # 02:30 UTC is still the previous evening in New York
+    assert local_date(utc(2024, 6, 2, 2, 30), "America/New_York") == date(2024, 6, 1)
+    # and already the next afternoon east of the date line
+    assert local_date(utc(2024, 6, 1, 23, 30), "Pacific/Kiritimati") == date(2024, 6, 2)
+    # naive timestamps are treated as UTC
+    assert local_date(datetime(2024, 6, 1, 23, 30), "UTC") == date(2024, 6, 1)
+
+
+def test_unknown_zone_falls_back_to_utc():
+    assert resolve_timezone("Mars/Olympus_Mons") == "UTC"
+    assert resolve_timezone(None) == "UTC"
+    assert compute_streaks([utc(2024, 1, 1, 12)], "Not/AZone")["streak_days"] == 1
+
+
+def test_late_evening_entries_count_for_the_local_day():
+    # 21:00 local in New York each day is 01:00/02:00 UTC the next day
+    stamps = [utc(2024, 6, d, 1) for d in range(2, 9)]
+    result = compute_streaks([s.isoformat() for s in stamps], "America/New_York")
+    assert result["streak_days"] == 7
+    assert result["last_entry_date"] == date(2024, 6, 7)
+
+
+def test_two_entries_on_one_local_day_are_one_day():
+    # 01:30 and 23:30 on the same Berlin day (UTC+1 in winter)
+    same_day = [utc(2024, 1, 10, 0, 30), utc(2024, 1, 10, 22, 30)]
+    assert compute_streaks(same_day, "Europe/Berlin")["streak_days"] == 1
+    # The same UTC day is two local days in Tokyo (UTC+9)
+    assert compute_streaks([utc(2024, 1, 10, 0, 30), utc(2024, 1, 10, 23, 30)], "Asia/Tokyo")["streak_days"] == 2
+
+
+def test_spring_forward_day_does_not_break_the_streak():
+    # US DST began 2024-03-10: that local day is only 23 hours long
+    stamps = [utc(2024, 3, d, 14) for d in range(7, 14)]
+    assert compute_streaks(stamps, "America/New_York")["streak_days"] == 7
+    assert replay(stamps, "America/New_York")["streak_days"] == 7
+
+
+def test_fall_back_day_does_not_double_count():
+    # US DST ended 2024-11-03: the 25-hour local day still counts once,
+    # even with entries in both 01:30 hours
+    stamps = [
+        utc(2024, 11, 2, 16),
+        utc(2024, 11, 3, 5, 30),  # 01:30 EDT
+        utc(2024, 11, 3, 6, 30),  # 01:30 EST
+        utc(2024, 11, 4, 16),
+    ]
+    result = compute_streaks(stamps, "America/New_York")
+    assert result["streak_days"] == 3
+    assert result["longest_streak"] == 3
+
+
+def test_southern_hemisphere_dst_change():
+    # Sydney DST ended 2024-04-07 at 03:00 local
+    stamps = [utc(2024, 4, d, 9) for d in range(4, 11)]
+    assert compute_streaks(stamps, "Australia/Sydney")["streak_days"] == 7
+
+
+def test_gap_resets_current_but_keeps_longest():
+    stamps = [utc(2024, 5, d, 12) for d in (1, 2, 3, 4, 10, 11)]
+    result = compute_streaks(stamps, "UTC")
+    assert result["streak_days"] == 2
+    assert result["longest_streak"] == 4
+
+
+def test_current_streak_lapses_after_a_full_missed_day():
+    state = {"streak_days": 5, "longest_streak": 5, "last_entry_date": date(2024, 5, 10)}
+    assert current_streak(state, date(2024, 5, 10)) == 5
+    # Yesterday's entry keeps the streak alive until today ends
+    assert current_streak(state, date(2024, 5, 11)) == 5
+    assert current_streak(state, date(2024, 5, 12)) == 0
+    assert current_streak({}, date(2024, 5, 12)) == 0
+
+
+def test_advance_streak_ignores_out_of_order_entries():
+    state = {"streak_days": 3, "longest_streak": 3, "last_entry_date": "2024-05-10"}
+    assert advance_streak(state, date(2024, 5, 2)) == {
+        "streak_days": 3, "longest_streak": 3, "last_entry_date": date(2024, 5, 10)
+    }
+
+
+def test_incremental_updates_match_full_backfill():
+    rng = random.Random(7)
+    for tz_name in ("UTC", "America/New_York", "Europe/London", "Asia/Kolkata", "Pacific/Auckland", "Pacific/Kiritimati"):
+        start = utc(2021, 1, 1)
+        stamps = []
+        moment = start
+        # Three years of entries with occasional gaps, at any hour
+        while moment < utc(2024, 1, 1):
+            stamps.append(moment)
+            moment += timedelta(hours=rng.choice([3, 20, 24, 24, 24, 30, 60]))
+        expected = compute_streaks(stamps, tz_name)
+        assert replay(stamps, tz_name) == expected, tz_name
@@ -0,0 +1,23 @@
+"""
+Transcription cache tests for DayVibe
+An uncached upload is looked up in the request and again in its job, but
+counts as one miss
+"""
+import asyncio
+
+from transcription_cache import TranscriptionCache
+
+
+def test_uncounted_lookup_leaves_the_miss_to_the_job():
+    async def scenario():
+        cache = TranscriptionCache(":memory:")
+        in_request = await cache.get("abc", count_miss=False)
+        in_job = await cache.get("abc")
+        await cache.put("abc", "hello")
+        retry = await cache.get("abc", count_miss=False)
+        return cache, in_request, in_job, retry
+
+    cache, in_request, in_job, retry = asyncio.run(scenario())
+    assert in_request is None and in_job is None
+    assert retry == "hello"
+    assert cache.misses == 1 and cache.hits == 1
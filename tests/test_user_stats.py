@@ -0,0 +1,60 @@
+"""
+User stats tests for DayVibe
+Each entry contributes one sentiment to the mood average, however many
+times it is analysed
+"""
+import asyncio
+
+import user_stats
+
+
+class StatsStore:
+    """Just enough of async_db for the stats read-modify-write loop"""
+
+    def __init__(self, entries=()):
+        self.row = None
+        self.entries = list(entries)
+
+    async def get_user_stats(self, user_id):
+        return dict(self.row) if self.row else None
+
+    async def create_user_stats(self, user_id):
+        self.row = {"user_id": user_id, "version": 0}
+
+    async def update_user_stats(self, user_id, version, changes):
+        if (self.row.get("version") or 0) != version:
+            return []
+        self.row.update(changes)
+        return [dict(self.row)]
+
+    async def entry_history(self, user_id):
+        return self.entries
+
+
+def test_reanalysis_replaces_the_entry_sentiment(monkeypatch):
+    store = StatsStore()
+    monkeypatch.setattr(user_stats, "async_db", store)
+
+    async def scenario():
+        await user_stats.record_sentiment("u1", 7.0)
+        await user_stats.record_sentiment("u1", 5.0)
+        # The first entry is analysed again and now scores 3
+        return await user_stats.record_sentiment("u1", 3.0, previous=7.0)
+
+    stats = asyncio.run(scenario())
+    assert stats["mood_samples"] == 2
+    assert stats["mood_total"] == 8.0 and stats["avg_mood"] == 4.0
+
+
+def test_rebuild_recomputes_mood_from_entries(monkeypatch):
+    store = StatsStore([
+        {"created_at": "2026-01-01T09:00:00+00:00", "mood_score": 6},
+        {"created_at": "2026-01-02T09:00:00+00:00", "mood_score": None},
+        {"created_at": "2026-01-03T09:00:00+00:00", "mood_score": 9}
+    ])
+    store.row = {"user_id": "u1", "version": 3, "mood_samples": 5, "mood_total": 40.0, "avg_mood": 8.0}
+    monkeypatch.setattr(user_stats, "async_db", store)
+
+    stats = asyncio.run(user_stats.rebuild_user_stats("u1", "UTC"))
+    assert stats["total_entries"] == 3
+    assert stats["mood_samples"] == 2 and stats["mood_total"] == 15.0 and stats["avg_mood"] == 7.5
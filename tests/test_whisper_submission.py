@@ -0,0 +1,73 @@
+"""
+Regression tests for in-memory Whisper submission: concurrent uploads used
+to share one temp_audio.wav and could transcribe each other's audio
+"""
+import asyncio
+import os
+import random
+import re
+
+import httpx
+import openai
+
+from ingest import SpooledAudio
+from openai_service import OpenAIService
+
+
+def clip(index: int) -> bytes:
+    """A distinct fake recording whose bytes name its index"""
+    return b"RIFF" + f"clip-{index:04d};".encode() * 2000
+
+
+async def echo_clip(request: httpx.Request) -> httpx.Response:
+    """Fake Whisper that answers with the clip id found in the uploaded file"""
+    body = await request.aread()
+    ids = set(re.findall(rb"clip-(\d{4});", body))
+    # Yield in between so requests interleave the way real uploads do
+    await asyncio.sleep(random.uniform(0, 0.05))
+    assert len(ids) == 1, f"request carried audio from clips {sorted(ids)}"
+    return httpx.Response(200, json={"text": ids.pop().decode()})
+
+
+def make_service() -> OpenAIService:
+    service = OpenAIService()
+    service.client = openai.AsyncOpenAI(
+        api_key="test",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(echo_clip)),
+        max_retries=0
+    )
+    return service
+
+
+def test_concurrent_transcriptions_send_their_own_audio(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    async def run():
+        service = make_service()
+        results = await asyncio.gather(*(service.transcribe_audio(clip(i)) for i in range(20)))
+        await service.close()
+        return results
+
+    assert asyncio.run(run()) == [f"{i:04d}" for i in range(20)]
+    # Nothing is written to the working directory any more
+    assert os.listdir(tmp_path) == []
+
+
+def test_memory_mapped_spool_files_are_sent_without_mixing(tmp_path):
+    spools = []
+    for i in range(8):
+        path = tmp_path / f"{i}.wav"
+        path.write_bytes(clip(i))
+        spools.append(SpooledAudio(str(path)))
+
+    async def run():
+        service = make_service()
+        results = await asyncio.gather(*(service.transcribe_audio(spool.buffer) for spool in spools))
+        await service.close()
+        return results
+
+    try:
+        assert asyncio.run(run()) == [f"{i:04d}" for i in range(8)]
+    finally:
+        for spool in spools:
+            spool.close()